@@ -0,0 +1,103 @@
+'''Solve collections of sudoku boards in parallel.
+
+solve_boards(boards, model, propagator, processes) fans the boards out
+over a multiprocessing pool and yields one result per board, in the
+order the boards finish. Each result is a dict with the keys
+
+   index       position of the board in the input iterable
+   status      status of the SolveResult returned by bt_search
+   solution    9x9 list of lists with the solution (None if unsolved)
+   nDecisions  variable assignments made by bt_search
+   nPrunings   values pruned by bt_search
+   runtime     CPU seconds used by bt_search
+   propagator  name of the propagator function
+   cpu_time    CPU seconds used by the worker to build and solve the model
+
+model is "binary", "all diff" or "bitboard" and propagator is "BT", "FC",
+"GAC" or "ALLDIFF", as for the flags in testcase.py. budget is an
+optional dict of the search budget arguments of bt_search (max_wall,
+max_cpu, max_decisions, max_prunings) applied to every board, so one
+hard board cannot stall the run: a board over budget gets the status
+"timed out".
+'''
+
+import multiprocessing
+import sys
+import time
+
+from sudoku_csp import *
+from propagator import *
+from sudoku_bitboard import *
+
+PROPAGATORS = {"BT": prop_BT,
+               "FC": prop_FC,
+               "GAC": prop_GAC,
+               "ALLDIFF": prop_ALLDIFF}
+
+
+def solve_board(job):
+    '''Worker routine: job is (index, board, model, propagator, budget)'''
+    index, board, model, propagator, budget = job
+    stime = time.process_time()
+    if model == "bitboard":
+        csp, var_array = sudoku_bitboard_model(board)
+        solver = BitboardBT(csp)
+    else:
+        #workers reuse one cached model per process
+        csp, var_array = sudoku_csp_model(board, model)
+        solver = BT(csp)
+    result = solver.bt_search(PROPAGATORS[propagator], verbose=False, **budget)
+    cpu_time = time.process_time() - stime
+
+    report = result.as_dict()
+    report["index"] = index
+    report["solution"] = result.grid(var_array) if result.solved() else None
+    report["cpu_time"] = cpu_time
+    return report
+
+
+def solve_boards(boards, model="binary", propagator="GAC", processes=None, chunksize=1,
+                 budget=None):
+    '''Solve every board of the iterable boards and yield the result
+       dict of each board as soon as it is solved (completion order,
+       use the "index" key to match results to boards).
+
+       processes is the size of the pool (default: number of CPUs).'''
+    if not model in SUDOKU_MODELS and model != "bitboard":
+        print("***Invalid model", model, "for solve_boards")
+        return
+    if not propagator in PROPAGATORS:
+        print("***Invalid propagator", propagator, "for solve_boards")
+        return
+
+    if budget is None:
+        budget = dict()
+    jobs = ((i, board, model, propagator, budget) for i, board in enumerate(boards))
+    with multiprocessing.Pool(processes) as pool:
+        for result in pool.imap_unordered(solve_board, jobs, chunksize):
+            yield result
+
+
+if __name__ == "__main__":
+    # usage: python batch.py [board set or board file] [model] [propagator] [processes]
+    #                        [seconds per board]
+    import os
+    import puzzle_io
+    if len(sys.argv) > 1 and os.path.exists(sys.argv[1]):
+        test_case_scope = puzzle_io.read_boards(sys.argv[1])
+    else:
+        import testcase     #large, so only imported for its board sets
+        test_case_scope = getattr(testcase, sys.argv[1]) if len(sys.argv) > 1 else testcase.all_boards
+    model = sys.argv[2] if len(sys.argv) > 2 else "binary"
+    propagator = sys.argv[3] if len(sys.argv) > 3 else "GAC"
+    processes = int(sys.argv[4]) if len(sys.argv) > 4 else None
+    budget = {"max_wall": float(sys.argv[5])} if len(sys.argv) > 5 else None
+
+    stime = time.time()
+    n = 0
+    for result in solve_boards(test_case_scope, model, propagator, processes, budget=budget):
+        print("Board {}: {} in {:.3f}s CPU, {} decisions, {} prunings".format(
+            result["index"], result["status"], result["cpu_time"],
+            result["nDecisions"], result["nPrunings"]))
+        n += 1
+    print("{} boards finished in {:.3f}s".format(n, time.time() - stime))
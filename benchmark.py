@@ -0,0 +1,350 @@
+'''Benchmark the sudoku models, propagators and variable orderings.
+
+run_benchmark solves the board sets of testcase.py with every
+combination of
+
+   model        "binary", "all diff"
+   propagator   "BT", "FC", "GAC" (and "ALLDIFF")
+   ordering     "MRV" (the default heap of BT), "DH", "random", "custom"
+                (ord_dh, ord_random and ord_custom of orderings.py)
+
+Each board is solved in a worker process and is stopped after timeout
+seconds; once a combination has timed out on max_timeouts boards its
+remaining boards are skipped. A board that is solved in time is solved
+again from a newly built model under tracemalloc, which slows the
+search down too much to time it, to measure the peak memory of the
+model and its search. The board sets nest (up_to_four contains
+up_to_five, ...), so every distinct board is solved once per
+combination and its result counted in each set holding it.
+
+For each set and combination the report records the number of boards
+solved, unsolved (no solution), timed out and skipped, and over the
+boards that finished the wall and CPU time, nDecisions, nPrunings and
+the largest peak memory of a solve. write_report saves it as JSON
+and compare_reports lists the changes against a saved baseline report.
+
+model_memory measures the bytes allocated per model instead (python
+benchmark.py --memory): for the binary and all diff models, and for a
+binary model whose not-equal constraints are replaced by table
+constraints, the form whose satisfying tuples dominate the size.
+
+large_scope checks that prop_ALLDIFF handles an all-diff constraint
+whose scope is far larger than a sudoku unit (python benchmark.py
+--large-scope N, 1000 variables by default): its matching and strongly
+connected components searches go as deep as the scope is large.
+
+usage: python benchmark.py [-h] [--sets SET ...] [--models MODEL ...]
+          [--propagators PROP ...] [--orderings ORD ...] [--timeout SECONDS]
+          [--max-timeouts N] [--output FILE] [--baseline FILE]
+          [--tolerance RATIO] [--memory] [--large-scope [N]]
+'''
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import platform
+import random
+import time
+import tracemalloc
+
+from sudoku_csp import *
+from orderings import ord_dh, ord_random, ord_custom
+from batch import PROPAGATORS
+import testcase
+
+BOARD_SETS = ["up_to_four", "up_to_five", "up_to_six", "up_to_seven", "all_boards"]
+MODELS = ["binary", "all diff"]
+ORDERINGS = {"MRV": None,
+             "DH": ord_dh,
+             "random": ord_random,
+             "custom": ord_custom}
+
+
+#how much slower a search runs under tracemalloc, at most
+TRACE_SLOWDOWN = 4
+
+
+def run_board(job):
+    '''Worker routine: job is (board, model, propagator, ordering, seed,
+       timeout)'''
+    board, model, propagator, ordering, seed, timeout = job
+    random.seed(seed)
+    wtime = time.perf_counter()
+    stime = time.process_time()
+    csp, var_array = sudoku_csp_model(board, model)
+    result = BT(csp).bt_search(PROPAGATORS[propagator], verbose=False, max_wall=timeout,
+                               var_ord=ORDERINGS[ordering])
+    if result.status == "timed out":
+        return {"status": "timeout"}
+    report = {"status": result.status,
+              "wall_time": time.perf_counter() - wtime,
+              "cpu_time": time.process_time() - stime,
+              "nDecisions": result.nDecisions,
+              "nPrunings": result.nPrunings}
+
+    #the same search again, with a model of its own (sudoku_csp_model
+    #reuses one built before tracing starts)
+    random.seed(seed)
+    tracemalloc.start()
+    csp, var_array = SUDOKU_MODELS[model](board)
+    BT(csp).bt_search(PROPAGATORS[propagator], verbose=False, var_ord=ORDERINGS[ordering])
+    report["peak_memory_kb"] = tracemalloc.get_traced_memory()[1] // 1024
+    tracemalloc.stop()
+    return report
+
+
+def table_binary_model(board, var_class=Variable):
+    '''The binary model with each not-equal constraint replaced by a
+       table constraint listing its satisfying tuples. The table model
+       has variables of its own, so the not-equal constraints are not
+       kept up to date as its variables are assigned.'''
+    csp, var_array = sudoku_csp_binary_model(board, var_class)
+    table_vars = init_vars(board, var_class)
+    var_of = dict((var_array[r][c], table_vars[r][c]) for r in range(9) for c in range(9))
+    table = CSP(csp.name, [var_of[v] for v in csp.vars])
+    for con in csp.cons:
+        x, y = [var_of[v] for v in con.scope]
+        c = Constraint(con.name, [x, y])
+        c.add_satisfying_tuples(t for t in itertools.product(x.domain(), y.domain())
+                                if t[0] != t[1])
+        table.add_constraint(c)
+    return table, table_vars
+
+
+MEMORY_MODELS = {"binary": sudoku_csp_binary_model,
+                 "all diff": sudoku_csp_all_diff_model,
+                 "binary table": table_binary_model}
+
+
+def model_memory(boards, var_class=Variable):
+    '''Return a dict with the mean number of bytes allocated to build
+       one model of each kind of MEMORY_MODELS, over boards'''
+    memory = dict()
+    for name, build in MEMORY_MODELS.items():
+        tracemalloc.start()
+        models = [build(board, var_class) for board in boards]
+        memory[name] = tracemalloc.get_traced_memory()[0] // len(models)
+        tracemalloc.stop()
+        del models
+    return memory
+
+
+def large_scope(n=1000):
+    '''Propagate one all-diff constraint over n variables with domain
+       range(n) with prop_ALLDIFF, at the root and after assigning the
+       first variable. Returns a dict with the status, the number of
+       values pruned and the seconds of each propagation.'''
+    vars = [Variable("V" + str(i), list(range(n))) for i in range(n)]
+    csp = CSP("large scope", vars)
+    csp.add_constraint(AllDiffConstraint("all diff", vars))
+    propagate = PROPAGATORS["ALLDIFF"]
+    checks = dict()
+    for name, var in (("root", None), ("assigned", vars[0])):
+        if var is not None:
+            var.assign(0)
+        stime = time.process_time()
+        status, prunings = propagate(csp, var)
+        checks[name] = {"status": status, "prunings": len(prunings),
+                        "cpu_time": time.process_time() - stime}
+    return checks
+
+
+def run_combination(boards, model, propagator, ordering, timeout, max_timeouts):
+    '''Solve each board in a worker process. Returns a list with the
+       result dict of run_board for each board, or a dict with the
+       status "timeout" or "skipped". The worker stops a search after
+       timeout seconds itself; it is replaced if it does not answer
+       in time for its traced solve too.'''
+    results = []
+    timeouts = 0
+    pool = multiprocessing.Pool(1)
+    try:
+        for i, board in enumerate(boards):
+            if timeouts >= max_timeouts:
+                results.append({"status": "skipped"})
+                continue
+            pending = pool.apply_async(run_board,
+                                       ((board, model, propagator, ordering, i, timeout),))
+            try:
+                result = pending.get(timeout * (1 + TRACE_SLOWDOWN))
+                results.append(result)
+                if result["status"] == "timeout":
+                    timeouts += 1
+            except multiprocessing.TimeoutError:
+                results.append({"status": "timeout"})
+                timeouts += 1
+                #the worker is still busy with the board, replace it
+                pool.terminate()
+                pool = multiprocessing.Pool(1)
+    finally:
+        pool.terminate()
+    return results
+
+
+def summarize(results):
+    '''Return the totals of a list of board results'''
+    summary = {"boards": len(results)}
+    for status in ("solved", "unsolved", "timeout", "skipped"):
+        summary[status] = sum(1 for r in results if r["status"] == status)
+    finished = [r for r in results if r["status"] in ("solved", "unsolved")]
+    for key in ("wall_time", "cpu_time", "nDecisions", "nPrunings"):
+        summary[key] = sum(r[key] for r in finished)
+    summary["peak_memory_kb"] = max(r["peak_memory_kb"] for r in finished) if finished else None
+    return summary
+
+
+def run_benchmark(sets=BOARD_SETS, models=MODELS, propagators=("BT", "FC", "GAC"),
+                  orderings=("MRV", "DH", "random", "custom"), timeout=10.0,
+                  max_timeouts=3, verbose=True):
+    '''Run every combination on the board sets (names of testcase.py
+       lists) and return the report dict'''
+    #the distinct boards of all the sets, and the position of each
+    #board of each set in that list
+    boards = []
+    position = dict()
+    members = dict()
+    for name in sets:
+        members[name] = []
+        for board in getattr(testcase, name):
+            key = tuple(val for row in board for val in row)
+            if key not in position:
+                position[key] = len(boards)
+                boards.append(board)
+            members[name].append(position[key])
+
+    report = {"platform": platform.platform(),
+              "python": platform.python_version(),
+              "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+              "timeout": timeout,
+              "max_timeouts": max_timeouts,
+              "results": []}
+    for model in models:
+        for propagator in propagators:
+            for ordering in orderings:
+                stime = time.time()
+                results = run_combination(boards, model, propagator, ordering,
+                                          timeout, max_timeouts)
+                for name in sets:
+                    summary = {"set": name, "model": model,
+                               "propagator": propagator, "ordering": ordering}
+                    summary.update(summarize([results[i] for i in members[name]]))
+                    report["results"].append(summary)
+                if verbose:
+                    total = summarize(results)
+                    print("{} {} {}: {} solved, {} unsolved, {} timeouts, {} skipped "
+                          "in {:.1f}s".format(model, propagator, ordering,
+                                              total["solved"], total["unsolved"],
+                                              total["timeout"], total["skipped"],
+                                              time.time() - stime))
+    return report
+
+
+def write_report(report, path):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=1)
+
+
+def read_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_reports(report, baseline, tolerance=0.1, min_seconds=0.5):
+    '''Compare the results of report with those of baseline for the
+       same set, model, propagator and ordering. Returns a list of dicts
+       with the CPU time and nDecisions ratios (report / baseline) and a
+       verdict: "slower" or "faster" if the CPU time changed by more
+       than tolerance and more than min_seconds (shorter runs are mostly
+       timer noise), "changed" if the boards finishing differ, else
+       "same".'''
+    def key(summary):
+        return (summary["set"], summary["model"], summary["propagator"], summary["ordering"])
+
+    base = dict((key(summary), summary) for summary in baseline["results"])
+    rows = []
+    for summary in report["results"]:
+        old = base.get(key(summary))
+        if old is None:
+            continue
+        row = dict(zip(("set", "model", "propagator", "ordering"), key(summary)))
+        row["cpu_ratio"] = summary["cpu_time"] / old["cpu_time"] if old["cpu_time"] else None
+        row["decision_ratio"] = (summary["nDecisions"] / old["nDecisions"]
+                                 if old["nDecisions"] else None)
+        significant = abs(summary["cpu_time"] - old["cpu_time"]) > min_seconds
+        if (summary["solved"], summary["unsolved"]) != (old["solved"], old["unsolved"]):
+            row["verdict"] = "changed"
+        elif significant and summary["cpu_time"] > old["cpu_time"] * (1 + tolerance):
+            row["verdict"] = "slower"
+        elif significant and summary["cpu_time"] < old["cpu_time"] * (1 - tolerance):
+            row["verdict"] = "faster"
+        else:
+            row["verdict"] = "same"
+        rows.append(row)
+    return rows
+
+
+def print_comparison(rows):
+    print("{:24} {:9} {:8} {:7} {:>9} {:>9}  {}".format(
+        "set", "model", "prop", "order", "cpu", "decisions", "verdict"))
+    for row in rows:
+        print("{:24} {:9} {:8} {:7} {:>9} {:>9}  {}".format(
+            row["set"], row["model"], row["propagator"], row["ordering"],
+            "-" if row["cpu_ratio"] is None else "{:.2f}x".format(row["cpu_ratio"]),
+            "-" if row["decision_ratio"] is None else "{:.2f}x".format(row["decision_ratio"]),
+            row["verdict"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the sudoku solvers")
+    parser.add_argument("--sets", nargs="+", default=BOARD_SETS)
+    parser.add_argument("--models", nargs="+", default=MODELS)
+    parser.add_argument("--propagators", nargs="+", default=["BT", "FC", "GAC"])
+    parser.add_argument("--orderings", nargs="+", default=["MRV", "DH", "random", "custom"])
+    parser.add_argument("--timeout", type=float, default=10.0,
+                        help="seconds allowed per board")
+    parser.add_argument("--max-timeouts", type=int, default=3,
+                        help="timeouts after which a combination is skipped")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--baseline", help="report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="relative CPU time change reported as slower or faster")
+    parser.add_argument("--memory", action="store_true",
+                        help="only measure the bytes allocated per model")
+    parser.add_argument("--large-scope", type=int, nargs="?", const=1000, metavar="N",
+                        help="only propagate an all-diff constraint over N variables")
+    args = parser.parse_args()
+
+    if args.memory:
+        for var_class in (Variable, BitVariable):
+            memory = model_memory(testcase.all_boards[:20], var_class)
+            for name in MEMORY_MODELS:
+                print("{:12} {:11} {:>9} bytes per model".format(
+                    name, var_class.__name__, memory[name]))
+        exit(0)
+
+    if args.large_scope is not None:
+        checks = large_scope(args.large_scope)
+        for name in checks:
+            print("{:8} status {}, {} prunings in {:.2f}s".format(
+                name, checks[name]["status"], checks[name]["prunings"],
+                checks[name]["cpu_time"]))
+        exit(0)
+
+    for name, values, choices in (("set", args.sets, dir(testcase)),
+                                  ("model", args.models, MODELS),
+                                  ("propagator", args.propagators, PROPAGATORS),
+                                  ("ordering", args.orderings, ORDERINGS)):
+        for value in values:
+            if value not in choices:
+                print("***Invalid {} {}. Terminating benchmark.py".format(name, value))
+                exit(1)
+
+    report = run_benchmark(args.sets, args.models, args.propagators, args.orderings,
+                           args.timeout, args.max_timeouts)
+    if args.baseline:
+        rows = compare_reports(report, read_report(args.baseline), args.tolerance)
+        report["baseline"] = {"path": args.baseline, "comparison": rows}
+        print_comparison(rows)
+    write_report(report, args.output)
+    print("Report written to", args.output)
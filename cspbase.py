@@ -1,6 +1,8 @@
  
 import time
 import functools
+import itertools
+import json
 
 '''Constraint Satisfaction Routines
    A) class Variable
@@ -16,6 +18,10 @@ import functools
       So one can remove values, add them back, and query if they are 
       still current. 
 
+      BitVariable offers the same interface but keeps the current
+      domain as an integer bitmask, so size and membership queries
+      take constant time.
+
     B) class constraint
 
       This class allows one to define constraints specified by tables
@@ -31,6 +37,13 @@ import functools
       for each variable in the constraint (in the same ORDER as the
       variables of the constraint were specified).
 
+      Constraints that would need huge tables can instead be defined
+      intensionally: PredicateConstraint takes a function that tests
+      an assignment, NotEqualConstraint requires its two variables to
+      differ and AllDiffConstraint requires all the variables in its
+      scope to take different values. They offer the same
+      check/has_support interface as the table constraint.
+
     C) Backtracking routine---takes propagator and CSP as arguments
        so that basic backtracking, forward-checking or GAC can be 
        executed depending on the propagator used.
@@ -73,6 +86,9 @@ class Variable:
            flags are not changed so that pruning and unpruning can
            work independently of assignment and unassignment. 
            '''
+    __slots__ = ('name', 'dom', 'curdom', 'assignedValue', 'trail', 'heap', 'id',
+                 'cons', 'cons_pos')
+
     #
     #set up and info methods
     #
@@ -82,16 +98,29 @@ class Variable:
         '''
         self.name = name                #text name for variable
         self.dom = list(domain)         #Make a copy of passed domain
-        self.curdom = [True] * len(domain)      #using list
+        self.curdom = bytearray(b'\x01') * len(self.dom)  #one flag byte per value
         #for bt_search
         self.assignedValue = None
+        #undo trail of the CSP being searched (set by bt_search while it
+        #runs, as a variable can belong to several CSPs)
+        self.trail = None
+        #heap of unassigned variables to notify of domain size changes
+        #(set by bt_search)
+        self.heap = None
+        #index in the variables of the CSP (set by CSP.compile)
+        self.id = None
+        #constraints of CSPs with the variable in their scope, and its
+        #position in each scope (set by CSP.add_constraint), whose
+        #unassigned counts assign and unassign keep up to date
+        self.cons = []
+        self.cons_pos = []
 
     def add_domain_values(self, values):
         '''Add additional domain values to the domain
            Removals not supported removals'''
         for val in values: 
             self.dom.append(val)
-            self.curdom.append(True)
+            self.curdom.append(1)
 
     def domain_size(self):
         '''Return the size of the (permanent) domain'''
@@ -107,11 +136,16 @@ class Variable:
 
     def prune_value(self, value):
         '''Remove value from CURRENT domain'''
-        self.curdom[self.value_index(value)] = False
+        i = self.value_index(value)
+        self.curdom[i] = 0
+        if self.trail is not None:
+            self.trail.append((self, i))
+        if self.heap is not None:
+            self.heap.update(self)
 
     def unprune_value(self, value):
         '''Restore value to CURRENT domain'''
-        self.curdom[self.value_index(value)] = True
+        self.untrail(self.value_index(value))
 
     def cur_domain(self):
         '''return list of values in CURRENT domain (if assigned 
@@ -141,12 +175,21 @@ class Variable:
         if self.is_assigned():
             return 1
         else:
-            return(sum(1 for v in self.curdom if v))
+            return self.curdom.count(1)
 
     def restore_curdom(self):
         '''return all values back into CURRENT domain'''
-        for i in range(len(self.curdom)):
-            self.curdom[i] = True
+        self.curdom[:] = b'\x01' * len(self.curdom)
+
+    def reset_domain(self, domain):
+        '''Replace the (permanent) domain and unassign the variable.
+           Only meant for reusing a model for a new problem instance
+           that differs in the variable domains (e.g., the givens of a
+           sudoku board) while no search is running.'''
+        if self.is_assigned():
+            self.unassign()
+        self.dom = list(domain)
+        self.curdom = bytearray(b'\x01') * len(self.dom)
 
     #
     #methods for assigning and unassigning
@@ -166,6 +209,9 @@ class Variable:
             return
 
         self.assignedValue = value
+        for c, i in zip(self.cons, self.cons_pos):
+            c.n_unasgn -= 1
+            c.unasgn_sum -= i
 
     def unassign(self):
         '''Used by bt_search. Unassign and restore old curdom'''
@@ -173,6 +219,9 @@ class Variable:
             print("ERROR: trying to unassign variable", self, " not yet assigned")
             return
         self.assignedValue = None
+        for c, i in zip(self.cons, self.cons_pos):
+            c.n_unasgn += 1
+            c.unasgn_sum += i
 
     def get_assigned_value(self):
         '''return assigned value...returns None if is unassigned'''
@@ -187,6 +236,16 @@ class Variable:
            in the domain list of a variable value'''
         return self.dom.index(value)
 
+    def untrail(self, token):
+        '''Undo a pruning recorded on the trail by prune_value'''
+        self.curdom[token] = 1
+        if self.heap is not None:
+            self.heap.update(self)
+
+    def trailed_value(self, token):
+        '''Return the value of a pruning recorded on the trail'''
+        return self.dom[token]
+
     def __repr__(self):
         return("Var-{}".format(self.name))
 
@@ -197,19 +256,146 @@ class Variable:
         '''Also print the variable domain and current domain'''
         print("Var--\"{}\": Dom = {}, CurDom = {}".format(self.name, 
                                                              self.dom, 
-                                                             self.curdom))
+                                                             [bool(f) for f in self.curdom]))
+class BitVariable(Variable):
+    '''Variable with the same interface as Variable, but whose current
+       domain is an integer bitmask (bit i set iff dom[i] is current)
+       with a cached count of the current values, and a dict mapping
+       each value to its bit. Domain size and membership queries are
+       constant time and do not build lists.'''
+    __slots__ = ('bit', 'cursize')
+
+    def __init__(self, name, domain=[]):
+        '''Create a variable object, specifying its name (a
+        string). Optionally specify the initial domain.
+        '''
+        self.name = name
+        self.dom = []
+        self.bit = dict()               #value --> bit of the value
+        self.curdom = 0                 #bitmask of current values
+        self.cursize = 0                #number of bits set in curdom
+        self.assignedValue = None
+        self.trail = None
+        self.heap = None
+        self.id = None
+        self.cons = []
+        self.cons_pos = []
+        self.add_domain_values(domain)
+
+    def add_domain_values(self, values):
+        '''Add additional domain values to the domain
+           Removals not supported removals'''
+        for val in values:
+            b = 1 << len(self.dom)
+            self.dom.append(val)
+            self.bit[val] = b
+            self.curdom |= b
+            self.cursize += 1
+
+    def prune_value(self, value):
+        '''Remove value from CURRENT domain'''
+        b = self.bit[value]
+        if self.curdom & b:
+            self.curdom ^= b
+            self.cursize -= 1
+            if self.trail is not None:
+                self.trail.append((self, b))
+            if self.heap is not None:
+                self.heap.update(self)
+
+    def unprune_value(self, value):
+        '''Restore value to CURRENT domain'''
+        self.untrail(self.bit[value])
+
+    def untrail(self, b):
+        '''Undo a pruning recorded on the trail by prune_value'''
+        if not self.curdom & b:
+            self.curdom |= b
+            self.cursize += 1
+            if self.heap is not None:
+                self.heap.update(self)
+
+    def trailed_value(self, b):
+        '''Return the value of a pruning recorded on the trail'''
+        return self.dom[b.bit_length() - 1]
+
+    def cur_domain(self):
+        '''return list of values in CURRENT domain (if assigned 
+           only assigned value is viewed as being in current domain)'''
+        if self.is_assigned():
+            return [self.assignedValue]
+        vals = []
+        m = self.curdom
+        while m:
+            low = m & -m
+            vals.append(self.dom[low.bit_length() - 1])
+            m ^= low
+        return vals
+
+    def in_cur_domain(self, value):
+        '''check if value is in CURRENT domain (without constructing list)
+           if assigned only assigned value is viewed as being in current 
+           domain'''
+        b = self.bit.get(value)
+        if b is None:
+            return False
+        if self.assignedValue is not None:
+            return value == self.assignedValue
+        return self.curdom & b != 0
+
+    def cur_domain_size(self):
+        '''Return the size of the variables domain (without construcing list)'''
+        if self.assignedValue is not None:
+            return 1
+        return self.cursize
+
+    def restore_curdom(self):
+        '''return all values back into CURRENT domain'''
+        self.curdom = (1 << len(self.dom)) - 1
+        self.cursize = len(self.dom)
+
+    def reset_domain(self, domain):
+        '''Replace the (permanent) domain and unassign the variable
+           (see Variable.reset_domain)'''
+        if self.is_assigned():
+            self.unassign()
+        self.dom = []
+        self.bit = dict()
+        self.curdom = 0
+        self.cursize = 0
+        self.add_domain_values(domain)
+
+    def value_index(self, value):
+        '''Domain values need not be numbers, so return the index
+           in the domain list of a variable value'''
+        return self.bit[value].bit_length() - 1
+
+    def print_all(self):
+        '''Also print the variable domain and current domain'''
+        print("Var--\"{}\": Dom = {}, CurDom = {}".format(self.name,
+                                                             self.dom,
+                                                             self.cur_domain()))
+
+#sat_tuples of the constraints without tables, shared so they cost nothing
+NO_TUPLES = frozenset()
+
 class Constraint: 
     '''Class for defining constraints variable objects specifes an
        ordering over variables.  This ordering is used when calling
        the satisfied function which tests if an assignment to the
        variables in the constraint's scope satisfies the constraint'''
+    __slots__ = ('name', 'scope', 'sat_tuples', 'sup_tuples', 'residues', 'id',
+                 'n_unasgn', 'unasgn_sum')
 
-    def __init__(self, name, scope): 
+    def __init__(self, name, scope, residues=True): 
         '''create a constraint object, specify the constraint name (a
         string) and its scope (an ORDERED list of variable objects).
         The order of the variables in the scope is critical to the
         functioning of the constraint.
 
+        If residues is True has_support remembers the last support
+        found for each variable/value pair (see has_support).
+
         Consraints are implemented as storing a set of satisfying
         tuples (i.e., each tuple specifies a value for each variable
         in the scope such that this sequence of values satisfies the
@@ -222,27 +408,58 @@ class Constraint:
 
         self.scope = list(scope)
         self.name = name
-        self.sat_tuples = dict()
+        self.id = None          #index in the constraints of the CSP (set by CSP.compile)
+
+        #the number of unassigned variables in the scope and the sum of
+        #their positions, kept up to date by Variable.assign and
+        #unassign once the constraint is added to a CSP (n_unasgn is
+        #None before): with one unassigned variable the sum is its
+        #position
+        self.n_unasgn = None
+        self.unasgn_sum = 0
+        self.sat_tuples = NO_TUPLES
 
         #The next object data item 'sup_tuples' will be used to help
         #support GAC propgation. It allows access to a list of 
         #satisfying tuples that contain a particular variable/value
-        #pair.
-        self.sup_tuples = dict()
+        #pair: sup_tuples[i][val] lists the tuples giving val to the
+        #i-th variable of the scope (None until tuples are added, so
+        #intensional constraints carry no tables).
+        self.sup_tuples = None
+
+        #residues[i][val] is the index in sup_tuples[i][val] of the
+        #last support found, or residues is None if they are not used
+        self.residues = [] if residues else None
 
     def add_satisfying_tuples(self, tuples):
         '''We specify the constraint by adding its complete list of satisfying tuples.'''
+        if self.sup_tuples is None:
+            self.sup_tuples = [dict() for var in self.scope]
+            if self.residues is not None:
+                self.residues = [dict() for var in self.scope]
+        #the tuples go into a set that freeze_tuples turns into a
+        #frozenset once they are all in
+        sat = self.sat_tuples
+        if type(sat) is not set:
+            sat = self.sat_tuples = set(sat)
         for x in tuples:
             t = tuple(x)  #ensure we have an immutable tuple
-            if not t in self.sat_tuples:
-                self.sat_tuples[t] = True
-
-            #now put t in as a support for all of the variable values in it
-            for i, val in enumerate(t):
-                var = self.scope[i]
-                if not (var,val) in self.sup_tuples:
-                    self.sup_tuples[(var,val)] = []
-                self.sup_tuples[(var,val)].append(t)
+            if not t in sat:
+                sat.add(t)
+                #now put t in as a support for all of the variable values in it
+                for i, val in enumerate(t):
+                    sup = self.sup_tuples[i]
+                    if not val in sup:
+                        sup[val] = []
+                    sup[val].append(t)
+
+    def freeze_tuples(self):
+        '''Store the satisfying tuples in a frozenset sized for them
+           (called by CSP.add_constraint and CSP.compile). Adding more
+           tuples afterwards is still allowed.'''
+        if type(self.sat_tuples) is set:
+            #(from a set, frozenset would allocate twice the table)
+            self.sat_tuples = frozenset(iter(self.sat_tuples))
 
     def get_scope(self):
         '''get list of variables the constraint is over'''
@@ -259,15 +476,23 @@ class Constraint:
 
     def get_n_unasgn(self):
         '''return the number of unassigned variables in the constraint's scope'''
-        n = 0
-        for v in self.scope:
-            if not v.is_assigned():
-                n = n + 1
-        return n
+        if self.n_unasgn is None:
+            #not in a CSP, so the count is not kept
+            return len(self.get_unasgn_vars())
+        return self.n_unasgn
+
+    def get_last_unasgn_var(self):
+        '''return the unassigned variable of a constraint with exactly
+           one unassigned variable in its scope'''
+        if self.n_unasgn is None:
+            return self.get_unasgn_vars()[0]
+        return self.scope[self.unasgn_sum]
 
     def get_unasgn_vars(self): 
         '''return list of unassigned variables in constraint's scope. Note
            more expensive to get the list than to then number'''
+        if self.n_unasgn is not None and self.n_unasgn <= 1:
+            return [self.scope[self.unasgn_sum]] if self.n_unasgn else []
         vs = []
         for v in self.scope:
             if not v.is_assigned():
@@ -278,13 +503,55 @@ class Constraint:
         '''Test if a variable value pair has a supporting tuple (a set
            of assignments satisfying the constraint where each value is
            still in the corresponding variables current domain
+
+           With residues (AC-3rm) the search starts at the last support
+           found for the pair and wraps around, so a support that is
+           still valid is found with a single tuple check. Residues are
+           only hints that are re-validated before use, so they need no
+           restoring when search backtracks.
         '''
-        if (var, val) in self.sup_tuples:
-            for t in self.sup_tuples[(var, val)]:
+        if self.sup_tuples is None:
+            return False
+        pos = self.scope.index(var)
+        tuples = self.sup_tuples[pos].get(val)
+        if tuples is None:
+            return False
+        if self.residues is None:
+            for t in tuples:
                 if self.tuple_is_valid(t):
                     return True
+            return False
+        residues = self.residues[pos]
+        start = residues.get(val, 0)
+        for i in itertools.chain(range(start, len(tuples)), range(start)):
+            if self.tuple_is_valid(tuples[i]):
+                residues[val] = i
+                return True
         return False
 
+    def scan_support(self, var, val):
+        '''has_support for profiled searches (see SearchProfile):
+           returns whether var=val has a support and the number of
+           tuples examined to find out'''
+        if self.sup_tuples is None:
+            return False, 0
+        pos = self.scope.index(var)
+        tuples = self.sup_tuples[pos].get(val)
+        if tuples is None:
+            return False, 0
+        if self.residues is None:
+            for k, t in enumerate(tuples):
+                if self.tuple_is_valid(t):
+                    return True, k + 1
+            return False, len(tuples)
+        residues = self.residues[pos]
+        start = residues.get(val, 0)
+        for k, i in enumerate(itertools.chain(range(start, len(tuples)), range(start))):
+            if self.tuple_is_valid(tuples[i]):
+                residues[val] = i
+                return True, k + 1
+        return False, len(tuples)
+
     def tuple_is_valid(self, t):
         '''Internal routine. Check if every value in tuple is still in
            corresponding variable domains'''
@@ -296,11 +563,308 @@ class Constraint:
     def __str__(self):
         return("{}({})".format(self.name,[var.name for var in self.scope]))
 
+class PredicateConstraint(Constraint):
+    '''Constraint specified by a function rather than a table of
+       satisfying tuples. The predicate is called with a list of
+       values (ordered as the scope) and returns True if and only if
+       they satisfy the constraint.
+
+       Supports are found by enumerating the current domains of the
+       other variables, so this is only sensible for small scopes
+       (e.g., binary constraints).'''
+    __slots__ = ('predicate',)
+
+    def __init__(self, name, scope, predicate):
+        Constraint.__init__(self, name, scope)
+        self.predicate = predicate
+
+    def add_satisfying_tuples(self, tuples):
+        print("ERROR: trying to add satisfying tuples to predicate constraint", self)
+
+    def check(self, vals):
+        return bool(self.predicate(list(vals)))
+
+    def has_support(self, var, val):
+        '''Test if var=val can be extended to an assignment satisfying
+           the predicate using values in the other variables current
+           domains'''
+        if not var.in_cur_domain(val):
+            return False
+        doms = []
+        for v in self.scope:
+            if v is var:
+                doms.append([val])
+            else:
+                doms.append(v.cur_domain())
+        for t in itertools.product(*doms):
+            if self.predicate(list(t)):
+                return True
+        return False
+
+    def scan_support(self, var, val):
+        '''has_support counting the tuples of values tried (see
+           Constraint.scan_support)'''
+        if not var.in_cur_domain(val):
+            return False, 0
+        doms = []
+        for v in self.scope:
+            if v is var:
+                doms.append([val])
+            else:
+                doms.append(v.cur_domain())
+        k = 0
+        for t in itertools.product(*doms):
+            k += 1
+            if self.predicate(list(t)):
+                return True, k
+        return False, k
+
+class NotEqualConstraint(Constraint):
+    '''Binary constraint requiring its two variables to take different
+       values. var=val has a support iff the other variable has a
+       current value other than val, i.e., its current domain has more
+       than one value or its single value is not val, which is checked
+       without enumerating tuples.'''
+    __slots__ = ()
+
+    def __init__(self, name, scope):
+        Constraint.__init__(self, name, scope, False)
+        if len(self.scope) != 2:
+            print("ERROR: not-equal constraint", self, "must have exactly two variables")
+
+    def add_satisfying_tuples(self, tuples):
+        print("ERROR: trying to add satisfying tuples to not-equal constraint", self)
+
+    def check(self, vals):
+        return vals[0] != vals[1]
+
+    def has_support(self, var, val):
+        '''Test if var=val leaves the other variable a value'''
+        if not var.in_cur_domain(val):
+            return False
+        other = self.scope[1] if var is self.scope[0] else self.scope[0]
+        n = other.cur_domain_size()
+        return n > 1 or (n == 1 and not other.in_cur_domain(val))
+
+    def scan_support(self, var, val):
+        '''has_support, which examines no tuples'''
+        return self.has_support(var, val), 0
+
+class AllDiffConstraint(Constraint):
+    '''Constraint requiring every variable in its scope to take a
+       different value. No tuples are stored: var=val has a support
+       iff the remaining variables can be matched to distinct values
+       of their current domains (other than val), which is found by
+       augmenting path bipartite matching.'''
+    __slots__ = ('matching',)
+
+    def __init__(self, name, scope):
+        Constraint.__init__(self, name, scope)
+        #value matched to each scope variable by the last call to
+        #regin_filter, used to warm start the next matching
+        self.matching = [None] * len(self.scope)
+
+    def add_satisfying_tuples(self, tuples):
+        print("ERROR: trying to add satisfying tuples to all-diff constraint", self)
+
+    def check(self, vals):
+        return len(set(vals)) == len(vals)
+
+    def has_support(self, var, val):
+        '''Test if var=val can be extended to an assignment of
+           distinct values to the rest of the scope'''
+        if not var.in_cur_domain(val):
+            return False
+        match = dict()  #value --> variable it is matched to
+        for v in self.scope:
+            if v is not var and not self.augment(v, match, set([val])):
+                return False
+        return True
+
+    def scan_support(self, var, val):
+        '''has_support, which examines no tuples'''
+        return self.has_support(var, val), 0
+
+    def regin_filter(self):
+        '''Regin's filtering algorithm. Compute a maximum matching
+           between the scope variables and their current domain values,
+           then return the list of (Variable, Value) pairs that belong
+           to no maximum matching, i.e., exactly the values without
+           support. Returns None if no matching covers every variable
+           (the constraint cannot be satisfied).
+
+           A value is kept if it is matched to the variable, if it is
+           reachable by an alternating path from an unmatched value,
+           or if it lies in the same strongly connected component as
+           the variable in the graph where matching edges are directed
+           variable-->value and the other edges value-->variable.'''
+        n = len(self.scope)
+        doms = [var.cur_domain() for var in self.scope]
+
+        #graph nodes: variable i is node i, values are numbered from n
+        val_node = dict()
+        for dom in doms:
+            for val in dom:
+                if not val in val_node:
+                    val_node[val] = n + len(val_node)
+
+        #maximum matching, keeping the edges of the previous matching
+        #that are still valid
+        match = dict()  #value --> variable index
+        for i in range(n):
+            val = self.matching[i]
+            if val in doms[i] and not val in match:
+                match[val] = i
+            else:
+                self.matching[i] = None
+        for i in range(n):
+            if self.matching[i] is None and not self.match_var(i, doms, match, set()):
+                return None
+
+        #directed graph over the nodes
+        succ = [[] for k in range(n + len(val_node))]
+        for i in range(n):
+            for val in doms[i]:
+                if val == self.matching[i]:
+                    succ[i].append(val_node[val])
+                else:
+                    succ[val_node[val]].append(i)
+
+        #nodes reachable from an unmatched value
+        stack = [val_node[val] for val in val_node if not val in match]
+        reached = [False] * len(succ)
+        for k in stack:
+            reached[k] = True
+        while stack:
+            for k in succ[stack.pop()]:
+                if not reached[k]:
+                    reached[k] = True
+                    stack.append(k)
+
+        comp = strongly_connected_components(succ)
+        prunings = []
+        for i, var in enumerate(self.scope):
+            for val in doms[i]:
+                k = val_node[val]
+                if val != self.matching[i] and not reached[k] and comp[i] != comp[k]:
+                    prunings.append((var, val))
+        return prunings
+
+    def match_var(self, i, doms, match, seen):
+        '''Internal routine. Find an augmenting path for the scope
+           variable with index i, updating match and self.matching.
+           The depth first search keeps its own stack, as a path can
+           pass through every variable of the scope.'''
+        path = [i]              #variables on the path
+        vals = []               #vals[d] is the value tried by path[d]
+        untried = [iter(doms[i])]
+        while path:
+            for val in untried[-1]:
+                if not val in seen:
+                    break
+            else:
+                #no augmenting path through path[-1]
+                path.pop()
+                untried.pop()
+                if vals:
+                    vals.pop()
+                continue
+            seen.add(val)
+            vals.append(val)
+            if val in match:
+                #try to re-match the variable holding val
+                path.append(match[val])
+                untried.append(iter(doms[match[val]]))
+                continue
+            for j, val in zip(path, vals):
+                match[val] = j
+                self.matching[j] = val
+            return True
+        return False
+
+    def augment(self, var, match, seen):
+        '''Internal routine. Try to match var to a value of its current
+           domain, re-matching previously matched variables along an
+           augmenting path (searched as in match_var). Values in seen
+           are not available.'''
+        path = [var]
+        vals = []
+        untried = [iter(var.cur_domain())]
+        while path:
+            for val in untried[-1]:
+                if not val in seen:
+                    break
+            else:
+                path.pop()
+                untried.pop()
+                if vals:
+                    vals.pop()
+                continue
+            seen.add(val)
+            vals.append(val)
+            if val in match:
+                path.append(match[val])
+                untried.append(iter(match[val].cur_domain()))
+                continue
+            for v, val in zip(path, vals):
+                match[val] = v
+            return True
+        return False
+
+def strongly_connected_components(succ):
+    '''Tarjan's algorithm over a graph given as a list of successor
+       lists (nodes are 0..len(succ)-1). Returns a list giving the
+       component number of each node. The depth first search keeps its
+       own stack of the nodes being visited with their unexplored
+       successors, so it is not bounded by the recursion limit.'''
+    index = [None] * len(succ)
+    low = [0] * len(succ)
+    comp = [None] * len(succ)
+    stack = []
+    next_index = 0
+    next_comp = 0
+
+    for root in range(len(succ)):
+        if index[root] is not None:
+            continue
+        index[root] = low[root] = next_index
+        next_index += 1
+        stack.append(root)
+        visiting = [(root, iter(succ[root]))]
+        while visiting:
+            k, untried = visiting[-1]
+            for j in untried:
+                if index[j] is None:
+                    #visit j before the rest of the successors of k
+                    index[j] = low[j] = next_index
+                    next_index += 1
+                    stack.append(j)
+                    visiting.append((j, iter(succ[j])))
+                    break
+                elif comp[j] is None:
+                    low[k] = min(low[k], index[j])
+            else:
+                visiting.pop()
+                if visiting:
+                    parent = visiting[-1][0]
+                    low[parent] = min(low[parent], low[k])
+                if low[k] == index[k]:
+                    while True:
+                        j = stack.pop()
+                        comp[j] = next_comp
+                        if j == k:
+                            break
+                    next_comp += 1
+    return comp
+
 class CSP:
     '''Class for packing up a set of variables into a CSP problem.
        Contains various utility routines for accessing the problem.
        The variables of the CSP can be added later or on initialization.
        The constraints must be added later'''
+    __slots__ = ('name', 'vars', 'cons', 'vars_to_cons', 'trail', 'unasgn_heap',
+                 'compiled', 'cons_start', 'var_cons', 'arc_start', 'arc_var', 'arc_con',
+                 'profile')
 
     def __init__(self, name, vars=[]):
         '''create a CSP object. Specify a name (a string) and 
@@ -310,24 +874,35 @@ class CSP:
         self.vars = []
         self.cons = []
         self.vars_to_cons = dict()
+        #While bt_search runs every prune_value of a variable of the CSP
+        #is recorded on the trail, so search can undo all prunings made
+        #since a mark
+        self.trail = []
+        #heap of the unassigned variables while bt_search is running
+        self.unasgn_heap = None
+        #the integer indexed form built by compile
+        self.compiled = False
+        #SearchProfile of the running bt_search, if it is profiled
+        self.profile = None
         for v in vars:
             self.add_var(v)
 
     def add_var(self,v):
         '''Add variable object to CSP while setting up an index
            to obtain the constraints over this variable'''
-        if not type(v) is Variable:
+        if not isinstance(v, Variable):
             print("Trying to add non variable ", v, " to CSP object")
         elif v in self.vars_to_cons:
             print("Trying to add variable ", v, " to CSP object that already has it")
         else:
             self.vars.append(v)
             self.vars_to_cons[v] = []
+            self.compiled = False
 
     def add_constraint(self,c):
         '''Add constraint to CSP. Note that all variables in the 
            constraints scope must already have been added to the CSP'''
-        if not type(c) is Constraint:
+        if not isinstance(c, Constraint):
             print("Trying to add non constraint ", c, " to CSP object")
         else:
             for v in c.scope:
@@ -336,6 +911,77 @@ class CSP:
                     return
                 self.vars_to_cons[v].append(c)
             self.cons.append(c)
+            self.compiled = False
+            c.freeze_tuples()
+            if c.n_unasgn is None:
+                #from now on the variables keep the unassigned counts of
+                #c (once, even if c is added to several CSPs)
+                c.n_unasgn = 0
+                for i, v in enumerate(c.scope):
+                    v.cons.append(c)
+                    v.cons_pos.append(i)
+                    if not v.is_assigned():
+                        c.n_unasgn += 1
+                        c.unasgn_sum += i
+
+    def compile(self):
+        '''Number the variables and constraints (v.id is the index of v
+           in self.vars, c.id that of c in self.cons) and build flat
+           adjacency arrays over these ids, so that the propagators and
+           bt_search can follow the constraint graph with list indexing
+           instead of hashing Variable and Constraint objects:
+
+           var_cons[cons_start[i]:cons_start[i+1]]
+                  ids of the constraints on variable i, in the order
+                  of get_cons_with_var
+           arc_start[j]:arc_start[j+1]
+                  the arcs of constraint j, one per variable of its
+                  scope in scope order. Arc a joins variable arc_var[a]
+                  to constraint arc_con[a], so a list or bytearray of
+                  length len(arc_var) can hold per-arc state.
+
+           bt_search compiles the CSP when it starts; adding a variable
+           or constraint afterwards makes it compile again, and so does
+           compiling another CSP over some of the same variables or
+           constraints, which renumbers them (see compile_if_needed).'''
+        for i, v in enumerate(self.vars):
+            v.id = i
+        for j, c in enumerate(self.cons):
+            c.id = j
+            c.freeze_tuples()
+
+        self.cons_start = [0]
+        self.var_cons = []
+        for v in self.vars:
+            for c in self.vars_to_cons[v]:
+                self.var_cons.append(c.id)
+            self.cons_start.append(len(self.var_cons))
+
+        self.arc_start = [0]
+        self.arc_var = []
+        self.arc_con = []
+        for c in self.cons:
+            for v in c.scope:
+                self.arc_var.append(v.id)
+                self.arc_con.append(c.id)
+            self.arc_start.append(len(self.arc_var))
+        self.compiled = True
+
+    def compile_if_needed(self, var=None):
+        '''Compile the CSP unless it is compiled and the ids of its
+           variables and constraints are still its own (another CSP
+           sharing them renumbers them when it compiles). With var only
+           the id of var is checked, the constant time test the
+           propagators make on every call; without, all of them.'''
+        if self.compiled:
+            if var is not None:
+                i = var.id
+                if i is not None and i < len(self.vars) and self.vars[i] is var:
+                    return
+            elif (all(v.id == i for i, v in enumerate(self.vars)) and
+                  all(c.id == j for j, c in enumerate(self.cons))):
+                return
+        self.compile()
 
     def get_all_cons(self):
         '''return list of all constraints in the CSP'''
@@ -349,6 +995,28 @@ class CSP:
         '''return list of variables in the CSP'''
         return list(self.vars)
 
+    def get_all_unasgn_vars(self):
+        '''return list of unassigned variables in the CSP'''
+        return [v for v in self.vars if not v.is_assigned()]
+
+    def trail_mark(self):
+        '''return a mark for the current position of the trail'''
+        return len(self.trail)
+
+    def undo_to(self, mark):
+        '''Restore every value pruned since mark was taken and pop
+           them off the trail'''
+        trail = self.trail
+        for i in range(len(trail) - 1, mark - 1, -1):
+            var, token = trail[i]
+            var.untrail(token)
+        del trail[mark:]
+
+    def pruned_since(self, mark):
+        '''return the list of (Variable, Value) pairs pruned since mark
+           was taken'''
+        return [(var, var.trailed_value(token)) for var, token in self.trail[mark:]]
+
     def print_all(self):
         print("CSP", self.name)
         print("   Variables = ", self.vars)
@@ -361,10 +1029,335 @@ class CSP:
             print(v, " = ", v.get_assigned_value(), "    ", end='')
         print("")
 
+class VarHeap:
+    '''Indexed binary min-heap of variables keyed on current domain
+       size, breaking ties in favour of the variable in more
+       constraints and then of the variable added to the CSP first.
+       Variables whose heap attribute is set to the heap call update
+       from prune_value/unprune_value, so keys are always current and
+       taking the minimum remaining values variable is O(log n).'''
+
+    def __init__(self, csp):
+        csp.compile_if_needed()
+        self.csp = csp
+        self.heap = []          #heap ordered list of variables
+        self.keys = []          #keys[i] is the key of heap[i]
+        self.nvars = len(csp.vars)
+        self.pos = [-1] * self.nvars    #variable id --> index in heap (-1 if absent)
+        #rank of each variable id among the ties of equal domain size
+        cons_start = csp.cons_start
+        order = sorted(range(self.nvars),
+                       key=lambda i: (cons_start[i] - cons_start[i + 1], i))
+        self.rank = [0] * self.nvars
+        for r, i in enumerate(order):
+            self.rank[i] = r
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, var):
+        return self.pos[var.id] >= 0
+
+    def key(self, var):
+        return var.cur_domain_size() * self.nvars + self.rank[var.id]
+
+    def push(self, var):
+        '''Add var to the heap'''
+        self.heap.append(var)
+        self.keys.append(self.key(var))
+        self.pos[var.id] = len(self.heap) - 1
+        self.sift_up(len(self.heap) - 1)
+
+    def peek(self):
+        '''Return the variable with the smallest key without removing it'''
+        return self.heap[0]
+
+    def pop(self):
+        '''Remove and return the variable with the smallest key'''
+        return self.remove(self.heap[0])
+
+    def remove(self, var):
+        '''Remove var from the heap and return it'''
+        i = self.pos[var.id]
+        self.pos[var.id] = -1
+        last = self.heap.pop()
+        lastkey = self.keys.pop()
+        if i < len(self.heap):
+            self.heap[i] = last
+            self.keys[i] = lastkey
+            self.pos[last.id] = i
+            self.sift_up(i)
+            self.sift_down(self.pos[last.id])
+        return var
+
+    def update(self, var):
+        '''Reposition var after its current domain size changed'''
+        i = self.pos[var.id]
+        if i < 0:
+            return
+        k = self.key(var)
+        old = self.keys[i]
+        self.keys[i] = k
+        if k < old:
+            self.sift_up(i)
+        elif k > old:
+            self.sift_down(i)
+
+    def sift_up(self, i):
+        heap, keys, pos = self.heap, self.keys, self.pos
+        var, k = heap[i], keys[i]
+        while i > 0:
+            parent = (i - 1) >> 1
+            if keys[parent] <= k:
+                break
+            heap[i] = heap[parent]
+            keys[i] = keys[parent]
+            pos[heap[i].id] = i
+            i = parent
+        heap[i] = var
+        keys[i] = k
+        pos[var.id] = i
+
+    def sift_down(self, i):
+        heap, keys, pos = self.heap, self.keys, self.pos
+        n = len(heap)
+        var, k = heap[i], keys[i]
+        while True:
+            child = 2 * i + 1
+            if child >= n:
+                break
+            if child + 1 < n and keys[child + 1] < keys[child]:
+                child += 1
+            if keys[child] >= k:
+                break
+            heap[i] = heap[child]
+            keys[i] = keys[child]
+            pos[heap[i].id] = i
+            i = child
+        heap[i] = var
+        keys[i] = k
+        pos[var.id] = i
+
 ########################################################
 # Backtracking Routine                                 #
 ########################################################
 
+class SearchBudget:
+    '''Limits on the effort of one search: wall-clock seconds, CPU
+       seconds, variable assignments and value prunings (None for no
+       limit). bt_search checks the budget after every decision and
+       stops with the status "timed out" once a limit is reached.'''
+
+    def __init__(self, max_wall=None, max_cpu=None, max_decisions=None, max_prunings=None):
+        self.max_wall = max_wall
+        self.max_cpu = max_cpu
+        self.max_decisions = max_decisions
+        self.max_prunings = max_prunings
+        self.limited = not (max_wall is None and max_cpu is None and
+                            max_decisions is None and max_prunings is None)
+        self.start()
+
+    def start(self):
+        '''Start the clocks'''
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+
+    def exceeded(self, nDecisions, nPrunings):
+        '''Return true if a limit has been reached'''
+        if self.max_decisions is not None and nDecisions >= self.max_decisions:
+            return True
+        if self.max_prunings is not None and nPrunings >= self.max_prunings:
+            return True
+        if self.max_cpu is not None and time.process_time() - self.cpu_start >= self.max_cpu:
+            return True
+        if self.max_wall is not None and time.perf_counter() - self.wall_start >= self.max_wall:
+            return True
+        return False
+
+
+class SearchProfile:
+    '''Counters and callback hooks for one bt_search call, enabled by
+       passing profile=SearchProfile(...) to bt_search (searches
+       without a profile do none of this bookkeeping). Counters:
+
+       nPropagatorCalls  calls of the propagator, the root call included
+       nSupportChecks    support checks made by the propagators
+       nTuplesScanned    tuples examined by table and predicate
+                         constraints for those checks
+       nBacktracks       assignments undone
+       maxDepth          deepest decision level reached
+       selectTime        seconds spent choosing variables and values
+       propagateTime     seconds spent in the propagator
+       restoreTime       seconds spent undoing assignments
+       totalTime         seconds of the whole search
+
+       The hooks, all optional, are called as
+
+       on_decision(var, val, depth)      after var=val is assigned
+       on_propagate(var, status, prunings)
+                                         after each propagator call
+                                         (var is None at the root)
+       on_prune(var, val)                for each value pruned, by the
+                                         propagator or the preprocessing
+       on_backtrack(var, depth)          after var=val is undone
+
+       The prunings are read from the trail of the CSP, so they are
+       complete even if the propagator returns no prune list. A
+       profiled search has the propagators check supports with
+       scan_support rather than has_support, to count the tuples.
+       as_dict and to_json export the counters.'''
+
+    def __init__(self, on_decision=None, on_propagate=None, on_prune=None, on_backtrack=None):
+        self.on_decision = on_decision
+        self.on_propagate = on_propagate
+        self.on_prune = on_prune
+        self.on_backtrack = on_backtrack
+        self.clear()
+
+    def clear(self):
+        '''Initialize counters'''
+        self.nPropagatorCalls = 0
+        self.nSupportChecks = 0
+        self.nTuplesScanned = 0
+        self.nBacktracks = 0
+        self.maxDepth = 0
+        self.selectTime = 0.0
+        self.propagateTime = 0.0
+        self.restoreTime = 0.0
+        self.totalTime = 0.0
+
+    def selected(self, depth, seconds):
+        if depth > self.maxDepth:
+            self.maxDepth = depth
+        self.selectTime += seconds
+
+    def decision(self, var, val, depth):
+        if self.on_decision is not None:
+            self.on_decision(var, val, depth)
+
+    def propagated(self, var, status, csp, mark, seconds):
+        self.nPropagatorCalls += 1
+        self.propagateTime += seconds
+        if self.on_propagate is not None or self.on_prune is not None:
+            prunings = csp.pruned_since(mark)
+            if self.on_propagate is not None:
+                self.on_propagate(var, status, prunings)
+            self.pruned(prunings)
+
+    def pruned(self, prunings):
+        if self.on_prune is not None:
+            for pvar, pval in prunings:
+                self.on_prune(pvar, pval)
+
+    def unsupported(self, constraint, var, values):
+        '''Return the values of var without support in constraint,
+           counting the checks and the tuples examined'''
+        self.nSupportChecks += len(values)
+        result = []
+        for val in values:
+            supported, scanned = constraint.scan_support(var, val)
+            self.nTuplesScanned += scanned
+            if not supported:
+                result.append(val)
+        return result
+
+    def backtracked(self, var, depth, seconds):
+        self.nBacktracks += 1
+        self.restoreTime += seconds
+        if self.on_backtrack is not None:
+            self.on_backtrack(var, depth)
+
+    def as_dict(self):
+        '''Return the counters as a dict'''
+        return {"nPropagatorCalls": self.nPropagatorCalls,
+                "nSupportChecks": self.nSupportChecks,
+                "nTuplesScanned": self.nTuplesScanned,
+                "nBacktracks": self.nBacktracks,
+                "maxDepth": self.maxDepth,
+                "selectTime": self.selectTime,
+                "propagateTime": self.propagateTime,
+                "restoreTime": self.restoreTime,
+                "totalTime": self.totalTime}
+
+    def to_json(self, path=None):
+        '''Return the counters as a JSON string, also written to path
+           if one is given'''
+        text = json.dumps(self.as_dict(), indent=1)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+
+class BudgetExceeded(Exception):
+    '''Raised inside the search to unwind it when the SearchBudget
+       runs out (caught by bt_search and bt_count)'''
+    pass
+
+
+class SolveResult:
+    '''Outcome of a bt_search call, so callers can use the solution
+       and statistics without parsing printed output.
+
+       status      "solved", "unsolved" (the CSP has no solution) or
+                   "timed out" (the search budget ran out first)
+       assignment  dict mapping each Variable to its assigned value
+                   (empty unless solved)
+       nDecisions  number of variable assignments made during search
+       nPrunings   number of values pruned during search
+       runtime     CPU time used by the search in seconds
+       propagator  name of the propagator function used
+       nSolutions  number of solutions found by bt_count (None for
+                   bt_search)
+       complete    False if bt_count stopped at its solution limit
+                   before exhausting the search space
+       preprocessing  report of the preprocess argument of bt_search
+                   (None without one, see preprocess.py)
+    '''
+
+    def __init__(self, csp, status, assignment, nDecisions, nPrunings, runtime, propagator,
+                 nSolutions=None, complete=True, preprocessing=None):
+        self.csp_name = csp.name
+        self.status = status
+        self.assignment = assignment
+        self.nDecisions = nDecisions
+        self.nPrunings = nPrunings
+        self.runtime = runtime
+        self.propagator = propagator
+        self.nSolutions = nSolutions
+        self.complete = complete
+        self.preprocessing = preprocessing
+
+    def solved(self):
+        return self.status == "solved"
+
+    def unique(self):
+        '''True if the CSP has exactly one solution (needs a bt_count
+           result with a limit of at least 2)'''
+        return self.nSolutions == 1 and self.complete
+
+    def grid(self, var_array):
+        '''Return the assigned values laid out as var_array (a list of
+           lists of Variables, e.g., the array returned by the sudoku
+           models). Unassigned cells are None.'''
+        return [[self.assignment.get(var) for var in row] for row in var_array]
+
+    def as_dict(self):
+        '''Return the statistics as a dict (without the assignment)'''
+        return {"csp": self.csp_name,
+                "status": self.status,
+                "nDecisions": self.nDecisions,
+                "nPrunings": self.nPrunings,
+                "runtime": self.runtime,
+                "propagator": self.propagator,
+                "nSolutions": self.nSolutions,
+                "complete": self.complete,
+                "preprocessing": self.preprocessing}
+
+    def __repr__(self):
+        return("SolveResult({}, {}, decisions={}, prunings={}, runtime={:.4f})".format(
+            self.csp_name, self.status, self.nDecisions, self.nPrunings, self.runtime))
+
 class BT:
     '''use a class to encapsulate things like statistics
        and bookeeping for pruning/unpruning variabel domains
@@ -384,6 +1377,10 @@ class BT:
         unasgn_vars = list() #used to track unassigned variables
         self.TRACE = False
         self.runtime = 0
+        self.budget = SearchBudget()
+        self.var_ord = None
+        self.val_ord = None
+        self.profile = None
 
     def trace_on(self):
         '''Turn search trace on'''
@@ -417,30 +1414,106 @@ class BT:
                 var.unassign()
             var.restore_curdom()
 
+    def start_search(self):
+        '''Compile the CSP if needed, restore all domains, point the
+           variables at the (cleared) trail of the CSP and put the
+           unassigned variables on the MRV heap'''
+        self.csp.compile_if_needed()
+        self.restore_all_variable_domains()
+        del self.csp.trail[:]
+
+        self.unasgn_vars = VarHeap(self.csp)
+        for v in self.csp.vars:
+            v.trail = self.csp.trail
+            v.heap = self.unasgn_vars
+            if not v.is_assigned():
+                self.unasgn_vars.push(v)
+        self.csp.unasgn_heap = self.unasgn_vars
+
+    def start_profile(self, profile):
+        '''Attach profile (or None) to the search and the CSP and zero its
+           counters'''
+        self.profile = profile
+        self.csp.profile = profile
+        if profile is not None:
+            profile.clear()
+            profile.totalTime = time.perf_counter()
+
+    def end_profile(self):
+        '''Collect the profile counters and detach the profile'''
+        profile = self.profile
+        if profile is not None:
+            profile.totalTime = time.perf_counter() - profile.totalTime
+        self.profile = None
+        self.csp.profile = None
+
+    def end_search(self):
+        '''Restore every value pruned during search and detach the trail
+           and the heap'''
+        self.csp.undo_to(0)
+        for v in self.csp.vars:
+            v.trail = None
+            v.heap = None
+        self.csp.unasgn_heap = None
+
     def extractMRVvar(self):
-        '''Remove variable with minimum sized cur domain from list of
-           unassigned vars. Would be faster to use heap...but this is
-           not production code.
+        '''Remove the next variable to assign from the heap of
+           unassigned vars: the one with minimum sized cur domain (ties
+           broken by degree), or the one picked by var_ord if bt_search
+           was given a variable ordering
         '''
-
-        md = -1
-        mv = None
-        for v in self.unasgn_vars:
-            if md < 0:
-                md = v.cur_domain_size()
-                mv = v
-            elif v.cur_domain_size() < md:
-                md = v.cur_domain_size()
-                mv = v
-        self.unasgn_vars.remove(mv)
-        return mv
+        if self.var_ord is None:
+            return self.unasgn_vars.pop()
+        var = self.var_ord(self.csp)
+        self.unasgn_vars.remove(var)
+        return var
+
+    def ordered_values(self, var):
+        '''Return the values of var's current domain in the order to try
+           them: domain order, or the order given by val_ord'''
+        if self.val_ord is None:
+            return var.cur_domain()
+        return self.val_ord(self.csp, var)
 
     def restoreUnasgnVar(self, var):
-        '''Add variable back to list of unassigned vars'''
-        self.unasgn_vars.append(var)
-        
-    def bt_search(self,propagator):
-        '''Try to solve the CSP using specified propagator routine
+        '''Add variable back to the heap of unassigned vars'''
+        self.unasgn_vars.push(var)
+
+    def check_budget(self):
+        '''Abort the search if the search budget has run out'''
+        if self.budget.exceeded(self.nDecisions, self.nPrunings):
+            raise BudgetExceeded()
+
+    def bt_search(self,propagator,verbose=True,iterative=False,
+                  max_wall=None,max_cpu=None,max_decisions=None,max_prunings=None,
+                  var_ord=None,val_ord=None,profile=None,preprocess=None):
+        '''Try to solve the CSP using specified propagator routine.
+           Returns a SolveResult; the outcome and statistics are also
+           printed unless verbose is False. If iterative is True the
+           search is run by bt_iterate instead of bt_recurse.
+
+           var_ord and val_ord are the variable and value ordering
+           functions of orderings.py (var_ord(csp) returns the next
+           unassigned Variable, val_ord(csp, var) the list of values
+           to try). By default the variable is popped from the MRV heap
+           and the values are tried in domain order, which is the
+           cheapest per node.
+
+           max_wall, max_cpu, max_decisions and max_prunings bound the
+           search (seconds of wall-clock and CPU time, variable
+           assignments and value prunings). When one is reached the
+           search stops, every variable is unassigned and its domain
+           restored, and the result has the status "timed out".
+
+           profile, a SearchProfile, turns on the profiling counters
+           and hooks for this search (see SearchProfile).
+
+           preprocess, e.g. a preprocess.Preprocessor, is called as
+           preprocess(csp, propagator) once the domains are restored and
+           before the root propagation. It prunes values with
+           prune_value (so its prunings count in nPrunings) and returns
+           (status, report); status False ends the search as unsolved
+           and the report is kept in the result's preprocessing.
 
            propagator == a function with the following template
            propagator(csp, newly_instantiated_variable=None)
@@ -465,46 +1538,192 @@ class BT:
 
            The list of variable values pairs are all of the values
            the propagator pruned (using the variable's prune_value method). 
-           bt_search NEEDS to know this in order to correctly restore these 
-           values when it undoes a variable assignment.
+           bt_search does not need the list to restore these values: 
+           every prune_value is recorded on the CSP's trail, and undoing
+           a variable assignment pops the trail back to the mark taken
+           before the assignment. A propagator may therefore return an
+           empty list; nPrunings is counted from the trail.
 
            NOTE propagator SHOULD NOT prune a value that has already been 
            pruned! Nor should it prune a value twice'''
 
         self.clear_stats()
         stime = time.process_time()
+        self.budget = SearchBudget(max_wall, max_cpu, max_decisions, max_prunings)
+        self.var_ord = var_ord
+        self.val_ord = val_ord
 
-        self.restore_all_variable_domains()
-        
-        self.unasgn_vars = []
-        for v in self.csp.vars:
-            if not v.is_assigned():
-                self.unasgn_vars.append(v)
+        self.start_search()
+        self.start_profile(profile)
 
-        status, prunings = propagator(self.csp) #initial propagate no assigned variables.
-        self.nPrunings = self.nPrunings + len(prunings)
+        status, prunings = True, []
+        preprocessing = None
+        if preprocess is not None:
+            status, preprocessing = preprocess(self.csp, propagator)
+            if profile is not None:
+                profile.pruned(self.csp.pruned_since(0))
+
+        if status == False:
+            pass    #the preprocessing found a contradiction
+        elif profile is not None:
+            mark = self.csp.trail_mark()
+            t = time.perf_counter()
+            status, prunings = propagator(self.csp)
+            profile.propagated(None, status, self.csp, mark, time.perf_counter() - t)
+        else:
+            status, prunings = propagator(self.csp) #initial propagate no assigned variables.
+        self.nPrunings = self.nPrunings + self.csp.trail_mark()
 
         if self.TRACE:
             print(len(self.unasgn_vars), " unassigned variables at start of search")
             print("Root Prunings: ", prunings)
 
+        timed_out = False
         if status == False:
-            print("CSP{} detected contradiction at root".format(
-                self.csp.name))
+            if verbose:
+                print("CSP{} detected contradiction at root".format(
+                    self.csp.name))
         else:
-            status = self.bt_recurse(propagator, 1)   #now do recursive search
-
-
-        self.restoreValues(prunings)
-        if status == False:
-            print("CSP{} unsolved. Has no solutions".format(self.csp.name))
+            try:
+                if iterative:
+                    status = self.bt_iterate(propagator)
+                else:
+                    status = self.bt_recurse(propagator, 1)   #now do recursive search
+            except BudgetExceeded:
+                status = False
+                timed_out = True
+
+        self.end_profile()
+        self.end_search()
+        if timed_out:
+            self.restore_all_variable_domains()
+        self.runtime = time.process_time() - stime
+
+        assignment = dict()
         if status == True:
-            print("CSP {} solved. CPU Time used = {}".format(self.csp.name,
-                                                             time.process_time() - stime))
-            self.csp.print_soln()
-
-        print("bt_search finished")
-        self.print_stats()
+            for v in self.csp.vars:
+                assignment[v] = v.get_assigned_value()
+        result = SolveResult(self.csp,
+                             "timed out" if timed_out else "solved" if status else "unsolved",
+                             assignment, self.nDecisions, self.nPrunings, self.runtime,
+                             propagator.__name__, preprocessing=preprocessing)
+
+        if verbose:
+            if preprocessing is not None:
+                print("Preprocessing prunings: {} in {:.4f}s{}".format(
+                    preprocessing["prunings"], preprocessing["runtime"],
+                    " (timed out)" if preprocessing["timed out"] else ""))
+            if timed_out:
+                print("CSP {} timed out. CPU Time used = {}".format(self.csp.name,
+                                                                   self.runtime))
+            elif status == False:
+                print("CSP{} unsolved. Has no solutions".format(self.csp.name))
+            if status == True:
+                print("CSP {} solved. CPU Time used = {}".format(self.csp.name,
+                                                                 self.runtime))
+                self.csp.print_soln()
+
+            print("bt_search finished")
+            self.print_stats()
+        return result
+
+    def bt_count(self, propagator, limit=None, verbose=True, on_solution=None,
+                 max_wall=None, max_cpu=None, max_decisions=None, max_prunings=None,
+                 var_ord=None, val_ord=None):
+        '''Count the solutions of the CSP with the same search and
+           propagators as bt_search, stopping once limit solutions are
+           found (limit=None counts them all). A uniqueness check is
+           bt_count(propagator, 2).unique().
+
+           on_solution, if given, is called with a dict mapping each
+           Variable to its value for every solution found, so the
+           solutions can be enumerated.
+
+           Returns a SolveResult whose nSolutions is the count, whose
+           assignment is the first solution found, and whose complete
+           flag is False if the limit stopped the search. The search
+           budget arguments are those of bt_search; when the budget
+           runs out the status is "timed out" and nSolutions the number
+           of solutions found so far. var_ord and val_ord are as for
+           bt_search.'''
+        self.clear_stats()
+        stime = time.process_time()
+        self.budget = SearchBudget(max_wall, max_cpu, max_decisions, max_prunings)
+        self.var_ord = var_ord
+        self.val_ord = val_ord
+        self.nSolutions = 0
+        self.limit = limit
+        self.on_solution = on_solution
+        self.first_solution = dict()
+
+        self.start_search()
+        status, prunings = propagator(self.csp)
+        self.nPrunings = self.nPrunings + self.csp.trail_mark()
+        stopped = timed_out = False
+        if status:
+            try:
+                stopped = self.count_recurse(propagator)
+            except BudgetExceeded:
+                stopped = timed_out = True
+        self.end_search()
+        if timed_out:
+            self.restore_all_variable_domains()
+        self.runtime = time.process_time() - stime
+
+        if timed_out:
+            status = "timed out"
+        else:
+            status = "solved" if self.nSolutions else "unsolved"
+        result = SolveResult(self.csp, status,
+                             self.first_solution, self.nDecisions, self.nPrunings,
+                             self.runtime, propagator.__name__,
+                             self.nSolutions, not stopped)
+        if verbose:
+            print("CSP {} has {}{} solutions{}. CPU Time used = {}".format(
+                self.csp.name, "at least " if stopped else "", self.nSolutions,
+                " (timed out)" if timed_out else "", self.runtime))
+            print("bt_count finished")
+            self.print_stats()
+        return result
+
+    def count_recurse(self, propagator):
+        '''Count the solutions below the current node, undoing every
+           assignment on the way back. Return true if the solution
+           limit was reached.'''
+        if not self.unasgn_vars:
+            #all variables assigned
+            self.nSolutions = self.nSolutions + 1
+            if self.nSolutions == 1 or self.on_solution is not None:
+                solution = dict()
+                for v in self.csp.vars:
+                    solution[v] = v.get_assigned_value()
+                if self.nSolutions == 1:
+                    self.first_solution = solution
+                if self.on_solution is not None:
+                    self.on_solution(solution)
+            return self.limit is not None and self.nSolutions >= self.limit
+
+        var = self.extractMRVvar()
+        stop = False
+        for val in self.ordered_values(var):
+            mark = self.csp.trail_mark()
+            var.assign(val)
+            self.nDecisions = self.nDecisions+1
+
+            status, prunings = propagator(self.csp, var)
+            self.nPrunings = self.nPrunings + self.csp.trail_mark() - mark
+            if self.budget.limited:
+                self.check_budget()
+            if status:
+                stop = self.count_recurse(propagator)
+
+            self.csp.undo_to(mark)
+            var.unassign()
+            if stop:
+                break
+
+        self.restoreUnasgnVar(var)
+        return stop
 
     def bt_recurse(self, propagator, level):
         '''Return true if found solution. False if still need to search.
@@ -517,20 +1736,35 @@ class BT:
             #all variables assigned
             return True
         else:
+            profile = self.profile
+            if profile is not None:
+                t = time.perf_counter()
             var = self.extractMRVvar()
+            values = self.ordered_values(var)
+            if profile is not None:
+                profile.selected(level, time.perf_counter() - t)
             if self.TRACE:
                 print('  ' * level, "bt_recurse var = ", var)
 
-            for val in var.cur_domain():
+            for val in values:
 
                 if self.TRACE:
                     print('  ' * level, "bt_recurse trying", var, "=", val)
 
+                mark = self.csp.trail_mark()
                 var.assign(val)
                 self.nDecisions = self.nDecisions+1
 
-                status, prunings = propagator(self.csp, var)
-                self.nPrunings = self.nPrunings + len(prunings)
+                if profile is not None:
+                    profile.decision(var, val, level)
+                    t = time.perf_counter()
+                    status, prunings = propagator(self.csp, var)
+                    profile.propagated(var, status, self.csp, mark, time.perf_counter() - t)
+                else:
+                    status, prunings = propagator(self.csp, var)
+                self.nPrunings = self.nPrunings + self.csp.trail_mark() - mark
+                if self.budget.limited:
+                    self.check_budget()
 
                 if self.TRACE:
                     print('  ' * level, "bt_recurse prop status = ", status)
@@ -541,10 +1775,77 @@ class BT:
                         return True
 
                 if self.TRACE:
-                    print('  ' * level, "bt_recurse restoring ", prunings)
-                self.restoreValues(prunings)
-                var.unassign()
+                    print('  ' * level, "bt_recurse restoring ", self.csp.pruned_since(mark))
+                if profile is not None:
+                    t = time.perf_counter()
+                    self.csp.undo_to(mark)
+                    var.unassign()
+                    profile.backtracked(var, level, time.perf_counter() - t)
+                else:
+                    self.csp.undo_to(mark)
+                    var.unassign()
 
             self.restoreUnasgnVar(var)
             return False
 
+    def bt_iterate(self, propagator):
+        '''Same search as bt_recurse (same variable and value order,
+           propagator calls and statistics) using an explicit stack
+           instead of one Python frame per decision level, so deep
+           searches cannot hit the recursion limit. Trace output is
+           not supported. Return true if found solution.'''
+
+        csp = self.csp
+        profile = self.profile
+        stack = []      #per level: [variable, values to try, next value, trail mark]
+        descend = True  #True when the last assignment propagated successfully
+        while True:
+            if descend:
+                if not self.unasgn_vars:
+                    #all variables assigned
+                    return True
+                if profile is not None:
+                    t = time.perf_counter()
+                var = self.extractMRVvar()
+                frame = [var, self.ordered_values(var), 0, csp.trail_mark()]
+                stack.append(frame)
+                if profile is not None:
+                    profile.selected(len(stack), time.perf_counter() - t)
+            else:
+                frame = stack[-1]
+                var = frame[0]
+                if var.is_assigned():
+                    if profile is not None:
+                        t = time.perf_counter()
+                        csp.undo_to(frame[3])
+                        var.unassign()
+                        profile.backtracked(var, len(stack), time.perf_counter() - t)
+                    else:
+                        csp.undo_to(frame[3])
+                        var.unassign()
+
+            if frame[2] == len(frame[1]):
+                #all values failed, backtrack to the previous level
+                stack.pop()
+                self.restoreUnasgnVar(var)
+                if not stack:
+                    return False
+                descend = False
+                continue
+
+            val = frame[1][frame[2]]
+            frame[2] += 1
+            var.assign(val)
+            self.nDecisions = self.nDecisions+1
+
+            if profile is not None:
+                profile.decision(var, val, len(stack))
+                t = time.perf_counter()
+                status, prunings = propagator(csp, var)
+                profile.propagated(var, status, csp, frame[3], time.perf_counter() - t)
+            else:
+                status, prunings = propagator(csp, var)
+            self.nPrunings = self.nPrunings + csp.trail_mark() - frame[3]
+            if self.budget.limited:
+                self.check_budget()
+            descend = status
@@ -0,0 +1,199 @@
+'''Generate random sudoku puzzles with a unique solution and grade them.
+
+A puzzle is made in three steps:
+
+   random_grid      fills an empty board with the bitboard engine
+                    (sudoku_bitboard.py), trying the values of each cell
+                    in random order
+   remove_givens    empties the cells of the grid in random order,
+                    putting a value back whenever removing it leaves the
+                    puzzle with more than one solution (checked with the
+                    bitboard solution count, limit 2, within the search
+                    budget CHECK_BUDGET; a check that runs out of
+                    budget counts as not unique)
+   grade_puzzle     measures the search effort of the CSP solvers on the
+                    puzzle and grades it
+
+The grade is the weakest propagator that solves the puzzle without
+backtracking (bt_search makes one decision per cell, givens included,
+and never undoes one), and the search effort of ALLDIFF on the all diff model when
+none does:
+
+   easy     FC on the binary model (naked singles are enough)
+   medium   ALLDIFF on the all diff model (matching based filtering)
+   hard     ALLDIFF needs fewer than HARD_DECISIONS wrong decisions
+   expert   ALLDIFF needs HARD_DECISIONS wrong decisions or more
+
+generate_puzzles(n, processes, seed) yields the puzzles from a
+multiprocessing pool, and running the module writes them to a board
+file (81-char lines followed by the grade, see puzzle_io.py).
+'''
+
+import multiprocessing
+import random
+import sys
+import time
+
+from cspbase import BT, SearchBudget, BudgetExceeded
+from propagator import prop_FC, prop_ALLDIFF
+from sudoku_csp import sudoku_csp_model
+from sudoku_bitboard import ALL, VALUE, propagate, choose_cell, BitboardBT
+import puzzle_io
+
+GRADES = ["easy", "medium", "hard", "expert"]
+
+#wrong decisions of ALLDIFF separating hard from expert puzzles
+HARD_DECISIONS = 10
+
+#search budget of a uniqueness check in remove_givens (a decision
+#budget, unlike a time budget, keeps the puzzle of a seed the same)
+CHECK_BUDGET = {"max_decisions": 100000}
+
+
+def random_grid(rng=random):
+    '''Return a random complete board, drawn with the random.Random rng'''
+    def fill(cands):
+        c = choose_cell(cands)
+        if c < 0:
+            return cands
+        bits = [1 << (v - 1) for v in range(1, 10) if cands[c] & (1 << (v - 1))]
+        rng.shuffle(bits)
+        for bit in bits:
+            child = list(cands)
+            child[c] = bit
+            if propagate(child, [c]) >= 0:
+                solution = fill(child)
+                if solution is not None:
+                    return solution
+        return None
+
+    cands = fill([ALL] * 81)
+    return [[VALUE[cands[r * 9 + c]] for c in range(9)] for r in range(9)]
+
+
+def count_solutions(board, limit=2, budget=None):
+    '''Return the number of solutions of board, at most limit, or None
+       if the search budget (a dict of the budget arguments of
+       bt_count) runs out first'''
+    cands = [ALL] * 81
+    givens = []
+    for c in range(81):
+        val = board[c // 9][c % 9]
+        if val != 0:
+            cands[c] = 1 << (val - 1)
+            givens.append(c)
+    if propagate(cands, givens) < 0:
+        return 0
+    solver = BitboardBT(None)
+    if budget:
+        solver.budget = SearchBudget(**budget)
+    try:
+        return solver.count(cands, limit)
+    except BudgetExceeded:
+        return None
+
+
+def remove_givens(grid, min_givens=17, symmetric=False, rng=random, budget=CHECK_BUDGET):
+    '''Return a puzzle with a unique solution made by emptying cells of
+       the complete board grid, keeping at least min_givens givens.
+       With symmetric set, cells are emptied in pairs symmetric about
+       the centre of the board. budget is the search budget of each
+       uniqueness check (None for no limit).'''
+    board = [list(row) for row in grid]
+    cells = list(range(81))
+    rng.shuffle(cells)
+    givens = 81
+    done = set()
+    for c in cells:
+        if c in done:
+            continue
+        pair = [c]
+        if symmetric and 80 - c != c:
+            pair.append(80 - c)
+        done.update(pair)
+        if givens - len(pair) < min_givens:
+            continue
+        saved = [board[p // 9][p % 9] for p in pair]
+        for p in pair:
+            board[p // 9][p % 9] = 0
+        if count_solutions(board, 2, budget) == 1:
+            givens -= len(pair)
+        else:
+            for p, val in zip(pair, saved):
+                board[p // 9][p % 9] = val
+    return board
+
+
+def grade_puzzle(board):
+    '''Grade a puzzle with a unique solution. Returns a dict with the
+       grade, the number of givens, the propagator that solved the
+       puzzle without backtracking (None if neither did) and the
+       nDecisions and nPrunings of ALLDIFF on the all diff model.'''
+    report = {"givens": 81 - sum(row.count(0) for row in board)}
+
+    csp, var_array = sudoku_csp_model(board, "all diff")
+    result = BT(csp).bt_search(prop_ALLDIFF, verbose=False)
+    report["nDecisions"] = result.nDecisions
+    report["nPrunings"] = result.nPrunings
+
+    #one decision per cell when no decision is undone
+    wrong = result.nDecisions - len(csp.vars)
+    if wrong == 0:
+        #FC is weaker, so only try it when ALLDIFF did not backtrack
+        csp, var_array = sudoku_csp_model(board, "binary")
+        easy = BT(csp).bt_search(prop_FC, verbose=False)
+        if easy.nDecisions == len(csp.vars):
+            report["grade"] = "easy"
+            report["propagator"] = "FC"
+        else:
+            report["grade"] = "medium"
+            report["propagator"] = "ALLDIFF"
+    else:
+        report["grade"] = "hard" if wrong < HARD_DECISIONS else "expert"
+        report["propagator"] = None
+    return report
+
+
+def make_puzzle(job):
+    '''Worker routine: job is (seed, min_givens, symmetric). Returns the
+       grade dict of grade_puzzle with the puzzle under "board".'''
+    seed, min_givens, symmetric = job
+    rng = random.Random(seed)
+    board = remove_givens(random_grid(rng), min_givens, symmetric, rng)
+    report = grade_puzzle(board)
+    report["board"] = board
+    report["seed"] = seed
+    return report
+
+
+def generate_puzzles(n, processes=None, seed=None, min_givens=17, symmetric=False):
+    '''Generate n graded puzzles over a multiprocessing pool and yield
+       the dict of make_puzzle for each as it is made. Puzzle i is drawn
+       from the seed seed + i, so a run can be reproduced.'''
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    jobs = ((seed + i, min_givens, symmetric) for i in range(n))
+    with multiprocessing.Pool(processes) as pool:
+        for report in pool.imap_unordered(make_puzzle, jobs):
+            yield report
+
+
+if __name__ == "__main__":
+    # usage: python generator.py <board file> [number of puzzles] [processes] [seed]
+    path = sys.argv[1] if len(sys.argv) > 1 else "generated.txt"
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    processes = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    seed = int(sys.argv[4]) if len(sys.argv) > 4 else None
+
+    stime = time.time()
+    reports = list(generate_puzzles(n, processes, seed))
+    reports.sort(key=lambda report: report["seed"])
+    puzzle_io.write_boards(path, [report["board"] for report in reports],
+                           lambda i, board: "{} {} {} {}".format(
+                               reports[i]["grade"], reports[i]["givens"],
+                               reports[i]["nDecisions"], reports[i]["nPrunings"]))
+    elapsed = time.time() - stime
+    for grade in GRADES:
+        print("{}: {}".format(grade, sum(1 for report in reports if report["grade"] == grade)))
+    print("{} puzzles written to {} in {:.3f}s ({:.0f} per minute)".format(
+        n, path, elapsed, n * 60 / elapsed))
@@ -26,6 +26,11 @@ val_ordering == a function with the following template
 
     val_ordering returns a list of all var's potential values, ordered from best value choice to worst value choice according to the heuristic.
 
+Both are passed to the search as BT(csp).bt_search(propagator,
+var_ord=var_ord, val_ord=val_ord), e.g. bt_search(prop_FC, var_ord=ord_dh,
+val_ord=val_lcv). Leaving either as None uses the fast default (the MRV
+heap of BT, values in domain order).
+
 '''
 
 
@@ -56,6 +61,9 @@ def ord_mrv(csp):
     (i.e., the variable with the fewest legal values).
     '''
 #IMPLEMENT
+    if csp.unasgn_heap is not None:
+        # bt_search keeps the unassigned variables in a heap
+        return csp.unasgn_heap.peek()
     unasgn_vars = csp.get_all_unasgn_vars()
     min_domain_size = 10000
     min_unasgn_var = None
@@ -147,8 +155,8 @@ def ord_custom(csp):
     '''    
 #IMPLEMENT
     # Use Degree Heuristic as a tier breaker 
-    for i in csp.get_all_unsign_vars():
-        for j in csp.get_all_unsign_vars():
+    for i in csp.get_all_unasgn_vars():
+        for j in csp.get_all_unasgn_vars():
             if i != j and i.cur_domain_size() != j.cur_domain_size():
                 return ord_mrv(csp)
     return ord_dh(csp)
@@ -0,0 +1,237 @@
+'''Preprocessing run by bt_search before the search starts.
+
+A Preprocessor is passed to bt_search (bt_search(prop_FC,
+preprocess=Preprocessor(var_array, max_wall=1.0))) and prunes values
+that no solution uses with the stages
+
+   naked singles    the value of a cell with a single value is pruned
+                    from the other cells of its row, column and box
+   hidden singles   a cell that is the only place left for a value in
+                    one of its units keeps only that value
+   naked pairs      two cells of a unit with the same two values: those
+                    values are pruned from the rest of the unit
+   pointing pairs   the cells of a box holding a value all lie in one
+                    row (column): the value is pruned from the rest of
+                    that row (column)
+   SAC              singleton arc consistency: every value is assigned
+                    in turn and prop_GAC (prop_ALLDIFF on models with
+                    all-different constraints) run, and the values
+                    whose propagation fails are pruned
+
+The first four need the 9x9 variable array of a sudoku model; without
+one only SAC runs, which works on any CSP. The stages run cheapest
+first, and after any stage prunes the pipeline restarts from the first
+stage, so SAC only probes once the sudoku rules are at fixpoint and the
+whole pipeline ends at a fixpoint of all stages.
+
+The prunings are made with prune_value after bt_search has restored
+the domains, so they are on the CSP's trail and are counted in the
+nPrunings of the search. The preprocessing has its own time budget
+(max_wall and max_cpu seconds); when it runs out the prunings made so
+far are kept and the search starts. The report returned to bt_search
+(SolveResult.preprocessing) gives the values pruned by each stage, the
+number of stage sweeps, the seconds used and whether it timed out.
+'''
+
+import time
+
+from cspbase import SearchBudget, AllDiffConstraint
+from propagator import prop_GAC, prop_ALLDIFF
+from sudoku_csp import get_row, get_col, get_subsquare
+
+SUDOKU_STAGES = ["naked singles", "hidden singles", "naked pairs", "pointing pairs"]
+STAGES = SUDOKU_STAGES + ["SAC"]
+
+DIGITS = range(1, 10)
+
+
+class Preprocessor:
+    '''Pipeline of preprocessing stages for bt_search (see the module
+       docstring). var_array is the 9x9 variable array of a sudoku model
+       (None for other CSPs, which only get SAC), stages the names of
+       the stages to run (default all that apply, in the order of
+       STAGES), propagator the propagator of the SAC probes, and
+       max_wall and max_cpu the budget in seconds. By default the
+       probes use prop_ALLDIFF if the CSP has all-different constraints
+       (whose has_support runs a full matching per value under
+       prop_GAC) and prop_GAC otherwise, whatever the search propagator
+       is: after a single assignment FC and BT almost never fail, so
+       they would refute no value.'''
+
+    def __init__(self, var_array=None, stages=None, propagator=None,
+                 max_wall=None, max_cpu=None):
+        if stages is None:
+            stages = STAGES if var_array is not None else ["SAC"]
+        for stage in stages:
+            if not stage in STAGES:
+                print("ERROR: unknown preprocessing stage", stage)
+            elif stage in SUDOKU_STAGES and var_array is None:
+                print("ERROR: preprocessing stage", stage, "needs the sudoku variable array")
+        self.stages = [stage for stage in STAGES if stage in stages
+                       and (var_array is not None or not stage in SUDOKU_STAGES)]
+        self.propagator = propagator
+        self.max_wall = max_wall
+        self.max_cpu = max_cpu
+        self.grid = var_array
+        if var_array is not None:
+            self.rows = [get_row(var_array, i) for i in range(9)]
+            self.cols = [get_col(var_array, i) for i in range(9)]
+            self.boxes = [get_subsquare(var_array, i) for i in range(9)]
+            self.units = self.rows + self.cols + self.boxes
+            self.peers = dict()
+            for r in range(9):
+                for c in range(9):
+                    box = self.boxes[(r // 3) * 3 + c // 3]
+                    var = var_array[r][c]
+                    self.peers[var] = [v for v in set(self.rows[r] + self.cols[c] + box)
+                                       if v is not var]
+
+    def __call__(self, csp, propagator):
+        '''Preprocess csp (called by bt_search with the search
+           propagator, which is not used). Returns (status, report):
+           status is False if a stage found that the CSP has no
+           solution.'''
+        budget = SearchBudget(self.max_wall, self.max_cpu)
+        stime = time.process_time()
+        self.csp = csp
+        self.probe = self.propagator
+        if self.probe is None:
+            if any(isinstance(c, AllDiffConstraint) for c in csp.cons):
+                self.probe = prop_ALLDIFF
+            else:
+                self.probe = prop_GAC
+        self.budget = budget
+        self.timed_out = False
+        report = {"prunings": dict((stage, 0) for stage in self.stages),
+                  "sweeps": 0,
+                  "timed out": False}
+        run = {"naked singles": self.naked_singles,
+               "hidden singles": self.hidden_singles,
+               "naked pairs": self.naked_pairs,
+               "pointing pairs": self.pointing_pairs,
+               "SAC": self.singleton_arc_consistency}
+
+        status = True
+        changed = True
+        while changed and status:
+            changed = False
+            for stage in self.stages:
+                if self.timed_out or budget.exceeded(0, 0):
+                    self.timed_out = True
+                    break
+                report["sweeps"] += 1
+                pruned = run[stage]()
+                if pruned < 0:
+                    report["prunings"][stage] += -pruned - 1
+                    status = False
+                    break
+                if pruned > 0:
+                    #restart from the cheapest stage
+                    report["prunings"][stage] += pruned
+                    changed = True
+                    break
+        report["timed out"] = self.timed_out
+        report["runtime"] = time.process_time() - stime
+        report["status"] = status
+        return status, report
+
+    #
+    #stages: each makes one sweep and returns the number of values
+    #pruned, or -1 - that number if a domain was wiped out
+    #
+
+    def naked_singles(self):
+        n = 0
+        for var in self.peers:
+            if var.cur_domain_size() == 1:
+                val = var.cur_domain()[0]
+                for peer in self.peers[var]:
+                    if peer.in_cur_domain(val):
+                        peer.prune_value(val)
+                        n += 1
+                        if peer.cur_domain_size() == 0:
+                            return -1 - n
+        return n
+
+    def hidden_singles(self):
+        n = 0
+        for unit in self.units:
+            for val in DIGITS:
+                places = [var for var in unit if var.in_cur_domain(val)]
+                if not places:
+                    return -1 - n
+                if len(places) == 1 and places[0].cur_domain_size() > 1:
+                    var = places[0]
+                    for other in var.cur_domain():
+                        if other != val:
+                            var.prune_value(other)
+                            n += 1
+        return n
+
+    def naked_pairs(self):
+        n = 0
+        for unit in self.units:
+            pairs = [var for var in unit if var.cur_domain_size() == 2]
+            for i, var in enumerate(pairs):
+                vals = var.cur_domain()
+                for twin in pairs[i + 1:]:
+                    if twin.cur_domain() != vals:
+                        continue
+                    for other in unit:
+                        if other is var or other is twin:
+                            continue
+                        for val in vals:
+                            if other.in_cur_domain(val):
+                                other.prune_value(val)
+                                n += 1
+                                if other.cur_domain_size() == 0:
+                                    return -1 - n
+        return n
+
+    def pointing_pairs(self):
+        n = 0
+        for b in range(9):
+            first_row = (b // 3) * 3
+            first_col = (b % 3) * 3
+            for val in DIGITS:
+                cells = [(first_row + j // 3, first_col + j % 3) for j in range(9)
+                         if self.grid[first_row + j // 3][first_col + j % 3].in_cur_domain(val)]
+                if len(cells) < 2:
+                    continue
+                line = None
+                if all(r == cells[0][0] for r, c in cells):
+                    line = [(cells[0][0], c) for c in range(9) if c // 3 != b % 3]
+                elif all(c == cells[0][1] for r, c in cells):
+                    line = [(r, cells[0][1]) for r in range(9) if r // 3 != b // 3]
+                if line is None:
+                    continue
+                for r, c in line:
+                    var = self.grid[r][c]
+                    if var.in_cur_domain(val):
+                        var.prune_value(val)
+                        n += 1
+                        if var.cur_domain_size() == 0:
+                            return -1 - n
+        return n
+
+    def singleton_arc_consistency(self):
+        csp = self.csp
+        n = 0
+        for var in csp.vars:
+            if var.is_assigned() or var.cur_domain_size() < 2:
+                continue
+            for val in var.cur_domain():
+                if self.budget.exceeded(0, 0):
+                    self.timed_out = True
+                    return n
+                mark = csp.trail_mark()
+                var.assign(val)
+                status, prunings = self.probe(csp, var)
+                csp.undo_to(mark)
+                var.unassign()
+                if not status:
+                    var.prune_value(val)
+                    n += 1
+                    if var.cur_domain_size() == 0:
+                        return -1 - n
+        return n
@@ -2,15 +2,25 @@
 propagator == a function with the following template
       propagator(csp, newly_instantiated_variable=None)
            ==> returns (True/False, [(Variable, Value), (Variable, Value) ...]
+
+The propagators walk the constraint graph through the integer indexed
+arrays built by CSP.compile (see cspbase.py), compiling the CSP first
+if needed.
 '''
 
+from collections import deque
+from cspbase import AllDiffConstraint
+
 
 # Backtracking propagation
 def prop_BT(csp, newVar=None):
     # Just check fully instantiated constraints
     if not newVar:
         return True, []
-    for constraint in csp.get_cons_with_var(newVar):
+    csp.compile_if_needed(newVar)
+    cons, var_cons = csp.cons, csp.var_cons
+    for k in range(csp.cons_start[newVar.id], csp.cons_start[newVar.id + 1]):
+        constraint = cons[var_cons[k]]
         if constraint.get_n_unasgn() == 0:
             vals = []
             vars = constraint.get_scope()
@@ -23,25 +33,30 @@ def prop_BT(csp, newVar=None):
 
 # Forward checking propagation
 def prop_FC(csp, newVar=None):
-    constraints = []
+    csp.compile_if_needed(newVar)
+    constraints = csp.cons
     if newVar:
-        constraints = csp.get_cons_with_var(newVar)
-    else:
-        constraints = csp.get_all_cons()
+        cons, var_cons = csp.cons, csp.var_cons
+        constraints = [cons[var_cons[k]] for k in
+                       range(csp.cons_start[newVar.id], csp.cons_start[newVar.id + 1])]
 
     prune_list = []  # output prune_list
+    profile = csp.profile
 
 
     for constraint in constraints:
         if constraint.get_n_unasgn() == 1:
             # unassigned constrain case
-            uv = constraint.get_unasgn_vars()[0]
-            curr_dom = uv.cur_domain()
-            for dom in curr_dom:
-                if not constraint.has_support(uv, dom):
-                    prune_list.append((uv, dom))
-                    # Prune from current dom
-                    uv.prune_value(dom)
+            uv = constraint.get_last_unasgn_var()
+            if profile is None:
+                unsupported = [dom for dom in uv.cur_domain()
+                               if not constraint.has_support(uv, dom)]
+            else:
+                unsupported = profile.unsupported(constraint, uv, uv.cur_domain())
+            for dom in unsupported:
+                prune_list.append((uv, dom))
+                # Prune from current dom
+                uv.prune_value(dom)
 
             # Check for DWO
             if uv.cur_domain_size() == 0:
@@ -51,31 +66,123 @@ def prop_FC(csp, newVar=None):
 
 # GAC propagation
 def prop_GAC(csp, newVar=None):
-    gacq = []
+    # The queue holds the ids of (constraint, variable) arcs (see
+    # CSP.compile): the values of the variable that need to be checked
+    # for support in the constraint. inq flags the arcs in the queue.
+    csp.compile_if_needed(newVar)
+    vars, cons = csp.vars, csp.cons
+    cons_start, var_cons = csp.cons_start, csp.var_cons
+    arc_start, arc_var, arc_con = csp.arc_start, csp.arc_var, csp.arc_con
+    if newVar:
+        gacq = deque()
+        inq = bytearray(len(arc_var))
+        vid = newVar.id
+        for k in range(cons_start[vid], cons_start[vid + 1]):
+            c = var_cons[k]
+            for a in range(arc_start[c], arc_start[c + 1]):
+                if arc_var[a] != vid:
+                    gacq.append(a)
+                    inq[a] = 1
+    else:
+        gacq = deque(range(len(arc_var)))
+        inq = bytearray(b'\x01') * len(arc_var)
     prune_list = []
+    profile = csp.profile
+
+    while gacq:
+        arc = gacq.popleft()    # getting an arc
+        inq[arc] = 0
+        constraint = cons[arc_con[arc]]
+        var = vars[arc_var[arc]]
+        if profile is None:
+            unsupported = [domain for domain in var.cur_domain()
+                           if not constraint.has_support(var, domain)]
+        else:
+            unsupported = profile.unsupported(constraint, var, var.cur_domain())
+        for domain in unsupported:
+            # Current domain does not work, Prune from domain
+            # non GAC values
+            prune_list.append((var, domain))
+            var.prune_value(domain)
+
+        if unsupported:
+            if var.cur_domain_size() == 0:
+                # DWO case, return false
+                return False, prune_list
+
+            # Only the arcs of the other variables of the constraints
+            # on var can have lost supports. For a binary constraint
+            # the arc back to the other variable of the same constraint
+            # cannot, as support is symmetric.
+            vid = arc_var[arc]
+            for k in range(cons_start[vid], cons_start[vid + 1]):
+                c2 = var_cons[k]
+                lo = arc_start[c2]
+                hi = arc_start[c2 + 1]
+                if c2 == arc_con[arc] and hi - lo == 2:
+                    continue
+                for arc2 in range(lo, hi):
+                    if not inq[arc2] and arc_var[arc2] != vid:
+                        gacq.append(arc2)
+                        inq[arc2] = 1
+
+    return True, prune_list
+
+# GAC propagation with Regin's all-different filtering
+def prop_ALLDIFF(csp, newVar=None):
+    # The queue holds constraint ids, inq flags the ones in the queue
+    csp.compile_if_needed(newVar)
+    cons, cons_start, var_cons = csp.cons, csp.cons_start, csp.var_cons
     if newVar:
-        gacq = csp.get_cons_with_var(newVar)
+        gacq = deque(var_cons[cons_start[newVar.id]:cons_start[newVar.id + 1]])
+        inq = bytearray(len(cons))
+        for c in gacq:
+            inq[c] = 1
     else:
-        gacq = csp.get_all_cons()
-
-    while len(gacq) > 0:
-        constraint = gacq.pop(0)    # getting a constraint
-        for var in constraint.get_scope():
-            for domain in var.cur_domain():
-                if not constraint.has_support(var, domain):
-                    # Current domain does not work, Prune from domain
-                    # non GAC values
+        gacq = deque(range(len(cons)))
+        inq = bytearray(b'\x01') * len(cons)
+    prune_list = []
+    profile = csp.profile
+
+    while gacq:
+        c = gacq.popleft()
+        inq[c] = 0
+        constraint = cons[c]
+        if isinstance(constraint, AllDiffConstraint):
+            # One matching pass prunes every unsupported value, so the
+            # constraint itself is GAC afterwards
+            pruned = constraint.regin_filter()
+            if pruned is None:
+                return False, prune_list
+            for var, domain in pruned:
+                prune_list.append((var, domain))
+                var.prune_value(domain)
+        else:
+            pruned = []
+            for var in constraint.get_scope():
+                if profile is None:
+                    unsupported = [domain for domain in var.cur_domain()
+                                   if not constraint.has_support(var, domain)]
+                else:
+                    unsupported = profile.unsupported(constraint, var, var.cur_domain())
+                for domain in unsupported:
+                    pruned.append((var, domain))
                     prune_list.append((var, domain))
                     var.prune_value(domain)
+                if unsupported and var.cur_domain_size() == 0:
+                    return False, prune_list
 
-                    if var.cur_domain_size() == 0:
-                        # DWO case, return false
-                        return False, prune_list
-
-                    # Appened the new constraint if not on queue
-                    for constraint2 in csp.get_cons_with_var(var):
-                        if constraint2 not in gacq:
-                            gacq.append(constraint2)
+        # Requeue the constraints on the variables that shrank
+        shrunk = []
+        for var, domain in pruned:
+            if var not in shrunk:
+                shrunk.append(var)
+        for var in shrunk:
+            for k in range(cons_start[var.id], cons_start[var.id + 1]):
+                c2 = var_cons[k]
+                if not inq[c2] and not (c2 == c and
+                        isinstance(constraint, AllDiffConstraint)):
+                    gacq.append(c2)
+                    inq[c2] = 1
 
     return True, prune_list
-
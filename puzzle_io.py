@@ -0,0 +1,90 @@
+'''Read and write sudoku boards in bulk.
+
+Boards are lists of 9 lists of 9 ints, with 0 for an empty cell (the
+format the sudoku models take). Two file layouts are understood, and
+may be mixed in one file:
+
+   81-char lines   one board per line, row by row, with 0 or . for
+                   empty cells, e.g. "2000000604008090...". Text after
+                   the 81 cells (such as a difficulty grade) is ignored.
+   board lists     the layout of boards.txt (and testcase.py): boards
+                   written as [[2,0,0,...],[...],...], optionally named
+                   "name = [[...". The rows of a board may be split over
+                   several lines.
+
+Lines starting with # are comments. Files ending in .gz are read and
+written through gzip. read_boards is a generator, so a file of any
+size can be streamed to the solver without holding it in memory.
+'''
+
+import gzip
+import re
+
+#one row of a board list: [d,d,d,d,d,d,d,d,d]
+ROW = re.compile(r'\[\s*(\d(?:\s*,\s*\d){8})\s*\]')
+#one 81-char board
+FLAT = re.compile(r'^[0-9.]{81}(?![0-9.])')
+
+
+def open_text(path, mode="r"):
+    '''Open path as a text file, through gzip if it ends in .gz'''
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t")
+    return open(path, mode)
+
+
+def parse_board81(line):
+    '''Return the board written as an 81-char string'''
+    cells = [0 if c == "." else int(c) for c in line[:81]]
+    return [cells[i:i + 9] for i in range(0, 81, 9)]
+
+
+def format_board81(board):
+    '''Return the 81-char string of a board'''
+    return "".join(str(val) for row in board for val in row)
+
+
+def iter_boards(lines):
+    '''Generate the boards in an iterable of text lines'''
+    rows = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if FLAT.match(line):
+            rows = []
+            yield parse_board81(line)
+            continue
+        for m in ROW.finditer(line):
+            rows.append([int(val) for val in m.group(1).split(",")])
+            if len(rows) == 9:
+                yield rows
+                rows = []
+
+
+def read_boards(source):
+    '''Generate the boards of a file. source is a path (gzipped if
+       it ends in .gz) or an open text file.'''
+    if isinstance(source, str):
+        with open_text(source) as f:
+            for board in iter_boards(f):
+                yield board
+    else:
+        for board in iter_boards(source):
+            yield board
+
+
+def write_boards(path, boards, suffix=None):
+    '''Write boards to path as 81-char lines (gzipped if path ends in
+       .gz). If suffix is given it is called with the index and board
+       and its result is appended to the line after a space. Returns
+       the number of boards written.'''
+    n = 0
+    with open_text(path, "w") as f:
+        for board in boards:
+            line = format_board81(board)
+            if suffix is not None:
+                line = line + " " + str(suffix(n, board))
+            f.write(line + "\n")
+            n += 1
+    return n
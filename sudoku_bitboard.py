@@ -0,0 +1,366 @@
+'''Specialized 9x9 sudoku engine working on bitboards.
+
+The candidates of the board are 81 nine-bit masks (bit v-1 set iff v is
+still possible in the cell). Placing a value removes its bit from the
+20 peers of the cell (precomputed tables), and propagation runs naked
+singles (a cell with one candidate left) and hidden singles (a value
+with one possible cell in a row, column or subsquare) to a fixpoint
+with bit operations. Search branches on a cell with the fewest
+candidates, copying the 81 masks per decision instead of undoing.
+
+sudoku_bitboard_model(board) mirrors the sudoku_csp model functions: it
+returns the puzzle and a 9x9 array of cells whose get_assigned_value()
+gives the solution once BitboardBT(puzzle).bt_search() has run, so it
+can be compared directly against the generic CSP models. The statistics
+use the units of cspbase.BT, which assigns every variable (givens
+included) with a decision: nDecisions counts one decision per cell
+placed, whether by a given, by propagation or by branching (81 for a
+board solved without a wrong guess), plus one per branch whose
+propagation fails. nPrunings counts the candidates removed by
+propagation, those of a propagation that fails excepted.
+'''
+
+import time
+
+from cspbase import SolveResult, SearchBudget, BudgetExceeded
+
+ALL = 0x1ff     #all nine values possible
+
+#the 27 units (rows, columns, subsquares) as lists of cell indices
+UNITS = ([[r * 9 + c for c in range(9)] for r in range(9)] +
+         [[r * 9 + c for r in range(9)] for c in range(9)] +
+         [[(b // 3) * 27 + (b % 3) * 3 + (k // 3) * 9 + k % 3 for k in range(9)]
+          for b in range(9)])
+
+#the 20 cells sharing a unit with each cell
+PEERS = [sorted(set(p for unit in UNITS if c in unit for p in unit) - set([c]))
+         for c in range(81)]
+
+#number of candidates in each mask
+POPCOUNT = [bin(m).count("1") for m in range(ALL + 1)]
+
+#value of a single-bit mask
+VALUE = dict((1 << (v - 1), v) for v in range(1, 10))
+
+
+def propagate(cands, queue):
+    '''Propagate the placements of the cells in queue (cells whose mask
+       was just reduced to a single bit) and then hidden singles, until
+       nothing changes. cands is modified in place. Returns the number
+       of candidates removed, or -1 if a contradiction was found.'''
+    pruned = 0
+    while True:
+        #naked singles: remove placed values from the peers
+        while queue:
+            c = queue.pop()
+            bit = cands[c]
+            for p in PEERS[c]:
+                m = cands[p]
+                if m & bit:
+                    m ^= bit
+                    if not m:
+                        return -1
+                    cands[p] = m
+                    pruned += 1
+                    if not m & (m - 1):
+                        queue.append(p)
+
+        #hidden singles: values possible in exactly one cell of a unit
+        for unit in UNITS:
+            once = twice = 0
+            for c in unit:
+                m = cands[c]
+                twice |= once & m
+                once |= m
+            if once != ALL:
+                return -1       #some value has no cell left in the unit
+            singles = once & ~twice
+            if not singles:
+                continue
+            for c in unit:
+                m = cands[c]
+                bit = m & singles
+                if bit and m & (m - 1):
+                    if bit & (bit - 1):
+                        return -1   #two values need the same cell
+                    cands[c] = bit
+                    pruned += POPCOUNT[m] - 1
+                    queue.append(c)
+        if not queue:
+            return pruned
+
+
+def count_placed(cands):
+    '''Return the number of cells with a single candidate'''
+    n = 0
+    for m in cands:
+        if not m & (m - 1):
+            n += 1
+    return n
+
+
+def choose_cell(cands):
+    '''Return the first unsolved cell with the fewest candidates, or -1
+       if every cell has a single candidate'''
+    best = -1
+    bestn = 10
+    for c in range(81):
+        n = POPCOUNT[cands[c]]
+        if 1 < n < bestn:
+            best = c
+            bestn = n
+            if n == 2:
+                break
+    return best
+
+
+class Cell:
+    '''Stands in for a Variable in the variable array of the bitboard
+       model: holds the name and the solved value of one cell.'''
+
+    def __init__(self, name):
+        self.name = name
+        self.assignedValue = None
+
+    def is_assigned(self):
+        return self.assignedValue != None
+
+    def get_assigned_value(self):
+        return self.assignedValue
+
+    def __repr__(self):
+        return("Var-{}".format(self.name))
+
+    def __str__(self):
+        return("Var--{}".format(self.name))
+
+
+class BitboardSudoku:
+    '''A 9x9 board given as a list of 9 lists of 9 ints (0 for empty)'''
+
+    def __init__(self, initial_sudoku_board):
+        self.name = "sudoku_bitboard_model"
+        self.board = [list(row) for row in initial_sudoku_board]
+        self.cells = [Cell('V' + str(c // 9) + str(c % 9)) for c in range(81)]
+
+    def initial_candidates(self):
+        '''Return the candidate masks with the givens placed (but not
+           yet propagated) and the list of given cells'''
+        cands = [ALL] * 81
+        givens = []
+        for c in range(81):
+            val = self.board[c // 9][c % 9]
+            if val != 0:
+                cands[c] = 1 << (val - 1)
+                givens.append(c)
+        return cands, givens
+
+    def print_soln(self):
+        print("CSP", self.name, " Assignments = ")
+        for cell in self.cells:
+            print(cell, " = ", cell.get_assigned_value(), "    ", end='')
+        print("")
+
+
+def sudoku_bitboard_model(initial_sudoku_board):
+    '''Return the bitboard puzzle for the board and a 9x9 list of lists
+       of Cells, in the same shape as the variable array of the
+       sudoku_csp models'''
+    puzzle = BitboardSudoku(initial_sudoku_board)
+    var_array = [puzzle.cells[r * 9:(r + 1) * 9] for r in range(9)]
+    return puzzle, var_array
+
+
+class BitboardBT:
+    '''Backtracking search over a BitboardSudoku, with the bt_search
+       interface of cspbase.BT. The engine does its own propagation
+       (naked and hidden singles), so the propagator argument of
+       bt_search is ignored.'''
+
+    def __init__(self, puzzle):
+        self.puzzle = puzzle
+        self.nDecisions = 0
+        self.nPrunings = 0
+        self.runtime = 0
+        self.first_solution = None
+        self.nSolutions = 0
+        self.budget = SearchBudget()
+
+    def clear_stats(self):
+        '''Initialize counters'''
+        self.nDecisions = 0
+        self.nPrunings = 0
+        self.runtime = 0
+
+    def print_stats(self):
+        print("Search made {} variable assignments and pruned {} variable values".format(
+            self.nDecisions, self.nPrunings))
+
+    def bt_search(self, propagator=None, verbose=True, max_wall=None, max_cpu=None,
+                  max_decisions=None, max_prunings=None):
+        '''Solve the puzzle, set the values of its cells and return a
+           SolveResult (propagator is ignored). The search budget
+           arguments are those of cspbase.BT.bt_search.'''
+        self.clear_stats()
+        stime = time.process_time()
+        self.budget = SearchBudget(max_wall, max_cpu, max_decisions, max_prunings)
+        puzzle = self.puzzle
+        for cell in puzzle.cells:
+            cell.assignedValue = None
+
+        cands, givens = puzzle.initial_candidates()
+        solution = None
+        timed_out = False
+        pruned = propagate(cands, givens)
+        if pruned >= 0:
+            self.nPrunings += pruned
+            placed = count_placed(cands)
+            self.nDecisions += placed
+            try:
+                solution = self.search(cands, placed)
+            except BudgetExceeded:
+                timed_out = True
+        self.runtime = time.process_time() - stime
+
+        assignment = dict()
+        if solution is not None:
+            for c, cell in enumerate(puzzle.cells):
+                cell.assignedValue = VALUE[solution[c]]
+                assignment[cell] = cell.assignedValue
+        if timed_out:
+            status = "timed out"
+        else:
+            status = "solved" if solution else "unsolved"
+        result = SolveResult(puzzle, status, assignment,
+                             self.nDecisions, self.nPrunings, self.runtime,
+                             "bitboard")
+        if verbose:
+            if timed_out:
+                print("CSP {} timed out. CPU Time used = {}".format(puzzle.name, self.runtime))
+            elif solution is None:
+                print("CSP{} unsolved. Has no solutions".format(puzzle.name))
+            else:
+                print("CSP {} solved. CPU Time used = {}".format(puzzle.name, self.runtime))
+                puzzle.print_soln()
+            print("bt_search finished")
+            self.print_stats()
+        return result
+
+    def bt_count(self, propagator=None, limit=None, verbose=True, max_wall=None,
+                 max_cpu=None, max_decisions=None, max_prunings=None):
+        '''Count the solutions of the puzzle, stopping once limit
+           solutions are found, with the bt_count interface of
+           cspbase.BT. The cells are set to the first solution found.
+           The search budget arguments are those of cspbase.BT.bt_count:
+           when the budget runs out the status is "timed out" and
+           nSolutions the number of solutions found so far.'''
+        self.clear_stats()
+        stime = time.process_time()
+        self.budget = SearchBudget(max_wall, max_cpu, max_decisions, max_prunings)
+        puzzle = self.puzzle
+        for cell in puzzle.cells:
+            cell.assignedValue = None
+
+        cands, givens = puzzle.initial_candidates()
+        self.first_solution = None
+        self.nSolutions = 0
+        timed_out = False
+        pruned = propagate(cands, givens)
+        if pruned >= 0:
+            self.nPrunings += pruned
+            placed = count_placed(cands)
+            self.nDecisions += placed
+            try:
+                self.count(cands, limit, placed)
+            except BudgetExceeded:
+                timed_out = True
+        self.runtime = time.process_time() - stime
+        nSolutions = self.nSolutions
+        complete = not timed_out and (limit is None or nSolutions < limit)
+
+        assignment = dict()
+        if self.first_solution is not None:
+            for c, cell in enumerate(puzzle.cells):
+                cell.assignedValue = VALUE[self.first_solution[c]]
+                assignment[cell] = cell.assignedValue
+        if timed_out:
+            status = "timed out"
+        else:
+            status = "solved" if nSolutions else "unsolved"
+        result = SolveResult(puzzle, status, assignment,
+                             self.nDecisions, self.nPrunings, self.runtime,
+                             "bitboard", nSolutions, complete)
+        if verbose:
+            print("CSP {} has {}{} solutions{}. CPU Time used = {}".format(
+                puzzle.name, "" if complete else "at least ", nSolutions,
+                " (timed out)" if timed_out else "", self.runtime))
+            print("bt_count finished")
+            self.print_stats()
+        return result
+
+    def count(self, cands, limit=None, placed=None):
+        '''Return the number of solutions extending the propagated masks
+           cands, at most limit (None for no limit). The first solution
+           found is kept in self.first_solution, and self.nSolutions
+           counts the solutions as they are found. placed is the number
+           of single candidate cells of cands (counted if None). Raises
+           BudgetExceeded when self.budget runs out.'''
+        if placed is None:
+            placed = count_placed(cands)
+        best = choose_cell(cands)
+        if best < 0:
+            if self.first_solution is None:
+                self.first_solution = cands
+            self.nSolutions += 1
+            return 1
+
+        found = 0
+        m = cands[best]
+        while m:
+            bit = m & -m
+            m ^= bit
+            child = list(cands)
+            child[best] = bit
+            pruned = propagate(child, [best])
+            if pruned >= 0:
+                child_placed = count_placed(child)
+                self.nDecisions += child_placed - placed
+            else:
+                self.nDecisions += 1
+            if self.budget.limited and self.budget.exceeded(self.nDecisions, self.nPrunings):
+                raise BudgetExceeded()
+            if pruned >= 0:
+                self.nPrunings += pruned
+                found += self.count(child, None if limit is None else limit - found,
+                                    child_placed)
+                if limit is not None and found >= limit:
+                    break
+        return found
+
+    def search(self, cands, placed):
+        '''Return the solved masks extending cands, which has placed
+           single candidate cells, or None'''
+        best = choose_cell(cands)
+        if best < 0:
+            return cands    #every cell has a single value
+
+        m = cands[best]
+        while m:
+            bit = m & -m
+            m ^= bit
+            child = list(cands)
+            child[best] = bit
+            pruned = propagate(child, [best])
+            if pruned >= 0:
+                child_placed = count_placed(child)
+                self.nDecisions += child_placed - placed
+            else:
+                self.nDecisions += 1
+            if self.budget.limited and self.budget.exceeded(self.nDecisions, self.nPrunings):
+                raise BudgetExceeded()
+            if pruned >= 0:
+                self.nPrunings += pruned
+                solution = self.search(child, child_placed)
+                if solution is not None:
+                    return solution
+        return None
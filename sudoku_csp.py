@@ -5,7 +5,7 @@ import itertools
 
 
 
-def init_vars(initial_sudoku_board):
+def init_vars(initial_sudoku_board, var_class=Variable):
     vars_all = [[None, None, None, None, None, None, None, None, None],
                 [None, None, None, None, None, None, None, None, None],
                 [None, None, None, None, None, None, None, None, None],
@@ -20,10 +20,10 @@ def init_vars(initial_sudoku_board):
         for col in range(9):
             init_value = initial_sudoku_board[row][col]        
             if init_value == 0:
-                temp = Variable('V' + str(row) + str(col), range(1,10))
+                temp = var_class('V' + str(row) + str(col), range(1,10))
                 vars_all[row][col] = temp
             else:
-                temp = Variable('V' + str(row) + str(col), [init_value])
+                temp = var_class('V' + str(row) + str(col), [init_value])
                 vars_all[row][col] = temp
                 
     return vars_all            
@@ -66,7 +66,7 @@ def all_diff(lst):
 #give actual value or range of values in here
 #use sudoku_csp = CSP(asdad)
 #    sudoku_csp.add_constraint
-def sudoku_csp_binary_model(initial_sudoku_board):
+def sudoku_csp_binary_model(initial_sudoku_board, var_class=Variable):
     '''Return a CSP object representing a sudoku CSP problem along 
        with an array of variables for the problem. That is return
 
@@ -116,10 +116,13 @@ def sudoku_csp_binary_model(initial_sudoku_board):
        
        All of the constraints of Model_1 MUST BE binary constraints 
        (i.e., constraints whose scope includes exactly two variables).
+
+       var_class is the class used for the variables, e.g., BitVariable
+       for bitmask domains.
     '''
 
     size = 9 #len of sudoku board
-    vars_all = init_vars(initial_sudoku_board)
+    vars_all = init_vars(initial_sudoku_board, var_class)
     chain_lst = list(itertools.chain(*vars_all))
     sudoku_csp = CSP('sudoku_csp_binary_model', chain_lst)
     
@@ -132,15 +135,7 @@ def sudoku_csp_binary_model(initial_sudoku_board):
                 cell_k = row_i[k]
                 con_name = 'C_Row' + cell_j.name + cell_k.name
                 con_scope = [cell_j, cell_k]
-                con = Constraint(con_name, con_scope)   
-                
-      
-                sat_tup = [[x,y] 
-                            for x in cell_j.cur_domain()
-                            for y in cell_k.cur_domain() 
-                            if x != y ]
-                    
-                con.add_satisfying_tuples(sat_tup)                    
+                con = NotEqualConstraint(con_name, con_scope)
                 sudoku_csp.add_constraint(con)
                 
     #Column constraint            
@@ -152,14 +147,7 @@ def sudoku_csp_binary_model(initial_sudoku_board):
                 cell_k = col_i[k]
                 con_name = 'C_Col' + cell_j.name + cell_k.name
                 con_scope = [cell_j, cell_k]
-                con = Constraint(con_name, con_scope)    
-                     
-                sat_tup = [[x,y] 
-                            for x in cell_j.cur_domain()
-                            for y in cell_k.cur_domain() 
-                            if x != y ]
-                    
-                con.add_satisfying_tuples(sat_tup)
+                con = NotEqualConstraint(con_name, con_scope)
                 sudoku_csp.add_constraint(con)
     
     #Subsqure constraint
@@ -171,138 +159,51 @@ def sudoku_csp_binary_model(initial_sudoku_board):
                     cell_k = sub_i[k]
                     con_name = 'C_Sub' + cell_j.name + cell_k.name
                     con_scope = [cell_j, cell_k]
-                    con = Constraint(con_name, con_scope)    
-                         
-                    sat_tup = [[x,y] 
-                                for x in cell_j.cur_domain()
-                                for y in cell_k.cur_domain() 
-                                if x != y ]
-                        
-                    con.add_satisfying_tuples(sat_tup)
+                    con = NotEqualConstraint(con_name, con_scope)
                     sudoku_csp.add_constraint(con)    
                 
     return sudoku_csp, vars_all
     
 
 #All Diff
-def sudoku_csp_all_diff_model(initial_sudoku_board):
-    #IMPLEMENT
-    i = 0
+def sudoku_csp_all_diff_model(initial_sudoku_board, var_class=Variable):
+    '''Return a CSP object representing a sudoku CSP problem along
+       with an array of variables for the problem (see
+       sudoku_csp_binary_model for the format of the board and of the
+       returned variable array).
+
+       The model has one variable per cell, with domain [1..9] for
+       empty cells and the given value for filled cells, and one
+       9-ary AllDiffConstraint for each row, column and subsquare.
+       The constraints are intensional, so no satisfying tuples are
+       enumerated when the model is built. var_class is the class used
+       for the variables.
+    '''
     dom = [1,2,3,4,5,6,7,8,9]
-    #construct variables
+    #construct all variables
     vars = []
-    #get fixed points => these variables' domain have only one value
-    i_index = 0
-    
-    fix_points = []
-    for i in initial_sudoku_board:
-        j_index = 0
-        for j in i:
-            if j != 0:
-                fix_points.append((i_index, j_index, j))
-            j_index += 1
-        i_index += 1
-    
-    print("ban var finished...")
-    #construct all variables, set each variables' domain based on fixed points
-    i_index = 0
-    for i in initial_sudoku_board:
-        j_index = 0
-        #ban list of values in every variable in this row
-        r_baned = [el[2] for el in fix_points if (el[0] == i_index)]
-        for j in i:
-            #ban list of values in every variable in this column
-            c_baned = [el[2] for el in fix_points if (el[1] == j_index)]
+    for i_index, i in enumerate(initial_sudoku_board):
+        for j_index, j in enumerate(i):
             if j == 0:
-                vars.append(Variable("({}, {})".format(i_index, j_index), dom))
-                for val_index in range(9):
-                    if (dom[val_index] in r_baned) or (dom[val_index] in c_baned):
-                        vars[-1].curdom[val_index] = False
+                vars.append(var_class("({}, {})".format(i_index, j_index), dom))
             else:
-                vars.append(Variable("({}, {})".format(i_index, j_index), [j]))
-            j_index += 1
-        i_index += 1
-    #ban fixed values in each small square
-    for i in range(9):
-        scope = get_square(vars, i)
-        buf = []
-        for var in scope:
-            if len(var.domain()) == 1:
-                buf.append(var.domain()[0])
-        for var in scope:
-            if len(var.domain()) != 1:
-                cur_dom = var.cur_domain()
-                for baned_val in buf:
-                    if baned_val in cur_dom:
-                        var.curdom[var.domain().index(baned_val)] = False
-                    
-                    
-            
-    print("cosntruct var finished...")
+                vars.append(var_class("({}, {})".format(i_index, j_index), [j]))
+
     #construct constrains
     cons = []
     #construct constrains representing each row
     for i in range(9):
-        con = Constraint("C Row{}".format(i), vars[(i * 9) : ((i+1) * 9)])
-        sat_tuples = []
-        nmb = []
-        for var in con.scope:
-            nmb.append(var.cur_domain())
-        for t in itertools.product(nmb[0], nmb[1], nmb[2], nmb[3], nmb[4], nmb[5], nmb[6], nmb[7], nmb[8]):
-            if len(set(t)) == 9:
-                sat_tuples.append(t)
-        if i == 0:
-            print(nmb[0])
-            print(nmb[1])
-            print(nmb[2])
-            print(nmb[3])
-            print(nmb[4])
-            print(nmb[5])
-            print(nmb[6])
-            print(nmb[7])
-            print(nmb[8])
-            print("Constrain", i, " --- ",sat_tuples)
-        con.add_satisfying_tuples(sat_tuples)
-        cons.append(con)
-    print("row finished...")
-    #construct constrains representing each row
+        cons.append(AllDiffConstraint("C Row{}".format(i), vars[(i * 9) : ((i+1) * 9)]))
+    #construct constrains representing each column
     for i in range(9):
         scope = []
         for j in range(9):
             scope.append(vars[i + (j * 9)])
-        con = Constraint("C Col{}".format(i), scope)
-        sat_tuples = []
-        nmb = []
-        for var in con.scope:
-            nmb.append(var.cur_domain())
-        for t in itertools.product(nmb[0], nmb[1], nmb[2], nmb[3], nmb[4], nmb[5], nmb[6], nmb[7], nmb[8]):
-            if len(set(t)) == 9:
-                sat_tuples.append(t)
-        print("Constrain", i, " --- ",len(sat_tuples))
-        con.add_satisfying_tuples(sat_tuples)
-        cons.append(con)
-    print("col finished...")  
-    #construct constrains representing each row
+        cons.append(AllDiffConstraint("C Col{}".format(i), scope))
+    #construct constrains representing each square
     for i in range(9):
-        scope = get_square(vars, i)
-        '''
-        for j in range(3):
-            scope.append(vars[(9 * 3 * int(i / 3)) + (3 * (i % 3)) + (9 * j) + 0])
-            scope.append(vars[(9 * 3 * int(i / 3)) + (3 * (i % 3)) + (9 * j) + 1])
-            scope.append(vars[(9 * 3 * int(i / 3)) + (3 * (i % 3)) + (9 * j) + 2])
-        '''
-        con = Constraint("C sqr{}".format(i), scope)
-        sat_tuples = []
-        nmb = []
-        for var in con.scope:
-            nmb.append(var.cur_domain())
-        for t in itertools.product(nmb[0], nmb[1], nmb[2], nmb[3], nmb[4], nmb[5], nmb[6], nmb[7], nmb[8]):
-            if len(set(t)) == 9:
-                sat_tuples.append(t)
-        print("Constrain", i, " --- ",len(sat_tuples))
-        con.add_satisfying_tuples(sat_tuples)
-        cons.append(con)
-    print("sqr finished...")   
+        cons.append(AllDiffConstraint("C sqr{}".format(i), get_square(vars, i)))
+
     #construct CSP  
     sudoku_csp = CSP("sudoku_csp_all_diff_model", vars)
     for c in cons:
@@ -310,9 +211,45 @@ def sudoku_csp_all_diff_model(initial_sudoku_board):
     variable_array = []
     for i in range(9):
         variable_array.append(vars[(i * 9) : ((i+1) * 9)])
-    wcnmb = BT(sudoku_csp)
-    wcnmb.restore_all_variable_domains()
-    print("all done...")
+    return sudoku_csp, variable_array
+
+#Cached models
+SUDOKU_MODELS = {"binary": sudoku_csp_binary_model,
+                 "all diff": sudoku_csp_all_diff_model}
+
+#(model, var_class) --> (csp, variable_array) built for an empty board
+model_templates = dict()
+
+def sudoku_csp_model(initial_sudoku_board, model="binary", var_class=Variable):
+    '''Return (csp, variable_array) for the board like the model
+       function named by model ("binary" or "all diff"), without
+       building it again. The variables and constraints are the same
+       for every 9x9 board, so each model is built once for an empty
+       board and instantiated by resetting the domains of the cells to
+       [1..9] or to their given value.
+
+       NOTE the returned CSP and variables are shared: the next call
+       for the same model and var_class re-initializes them for its
+       board. Build the model directly to keep several boards alive.
+    '''
+    if not model in SUDOKU_MODELS:
+        print("***Invalid model", model)
+        return None
+    key = (model, var_class)
+    if not key in model_templates:
+        empty_board = [[0] * 9 for i in range(9)]
+        model_templates[key] = SUDOKU_MODELS[model](empty_board, var_class)
+    sudoku_csp, variable_array = model_templates[key]
+
+    dom = [1,2,3,4,5,6,7,8,9]
+    for row in range(9):
+        for col in range(9):
+            init_value = initial_sudoku_board[row][col]
+            if init_value == 0:
+                variable_array[row][col].reset_domain(dom)
+            else:
+                variable_array[row][col].reset_domain([init_value])
+    del sudoku_csp.trail[:]
     return sudoku_csp, variable_array
 
 def get_square(vars, n):
@@ -0,0 +1,116 @@
+'''Propagate many sudoku boards at once with NumPy.
+
+N boards are held as an (N, 81, 9) boolean candidate array (cand[n, c, v]
+is True iff value v+1 is still possible in cell c of board n). Each
+round of propagate_batch, for all boards at once:
+
+   - removes the values of solved cells from their peers
+     (a product with the 81x81 peer matrix)
+   - places hidden singles, i.e. values with a single possible cell in
+     a row, column or subsquare (products with the 27x81 unit matrix)
+   - marks boards with an empty cell or a value missing from a unit as
+     dead (no solution)
+
+until no candidate changes. solve_boards_vectorized then only runs
+the bitboard backtracking search (sudoku_bitboard.py) on the boards
+propagation did not solve, starting from the propagated cells.
+
+Requires NumPy.
+'''
+
+import numpy as np
+
+from sudoku_bitboard import UNITS, PEERS, sudoku_bitboard_model, BitboardBT
+
+#UNIT[u, c] is 1 iff cell c is in unit u (float32 so that the products
+#below are done by the BLAS matrix multiply)
+UNIT = np.zeros((27, 81), dtype=np.float32)
+for u, unit in enumerate(UNITS):
+    UNIT[u, unit] = 1
+
+#PEER[c, p] is 1 iff cell p is a peer of cell c
+PEER = np.zeros((81, 81), dtype=np.float32)
+for c in range(81):
+    PEER[c, PEERS[c]] = 1
+
+
+def boards_to_candidates(boards):
+    '''Return the (N, 81, 9) candidate array of a list of boards'''
+    givens = np.asarray(boards, dtype=np.int8).reshape(-1, 81)
+    cand = np.ones((len(givens), 81, 9), dtype=bool)
+    filled = givens > 0
+    cand[filled] = False
+    n, c = np.nonzero(filled)
+    cand[n, c, givens[filled] - 1] = True
+    return cand
+
+
+def candidates_to_boards(cand):
+    '''Return the boards of a candidate array, with 0 for every cell
+       that does not have exactly one candidate'''
+    single = cand.sum(axis=2) == 1
+    values = np.where(single, cand.argmax(axis=2) + 1, 0)
+    return values.reshape(-1, 9, 9).tolist()
+
+
+def propagate_batch(cand, max_rounds=81):
+    '''Propagate naked and hidden singles on every board of cand (an
+       (N, 81, 9) boolean array, modified in place) until a fixpoint.
+       Boards drop out of the rounds as soon as they stop changing.
+       Returns an (N,) boolean array, False for the boards found to
+       have no solution.'''
+    alive = np.ones(len(cand), dtype=bool)
+    active = np.arange(len(cand))
+    for r in range(max_rounds):
+        if not len(active):
+            break
+        sub = cand[active]
+        before = sub.copy()
+
+        #naked singles: remove the values of solved cells from their peers
+        single = sub.sum(axis=2) == 1
+        placed = (sub & single[:, :, None]).astype(np.float32)
+        sub &= np.matmul(PEER, placed) == 0
+
+        #hidden singles: values possible in exactly one cell of a unit
+        counts = np.matmul(UNIT, sub.astype(np.float32))       #(n, 27, 9)
+        once = (counts == 1).astype(np.float32)
+        forced = (np.matmul(UNIT.T, once) > 0) & sub           #(n, 81, 9)
+        has_forced = forced.any(axis=2)
+        sub[has_forced] = forced[has_forced]
+        cand[active] = sub
+
+        #contradictions: an empty cell, a value with no cell in a unit,
+        #or a cell forced to two values
+        ok = sub.any(axis=2).all(axis=1)
+        ok &= (counts > 0).all(axis=(1, 2))
+        ok &= (forced.sum(axis=2) <= 1).all(axis=1)
+        alive[active] = ok
+
+        changed = (sub != before).any(axis=(1, 2))
+        active = active[ok & changed]
+    return alive
+
+
+def solve_boards_vectorized(boards):
+    '''Solve a list of boards, propagating them all together and
+       searching only the ones left unsolved. Returns a list with, for
+       each board, the solved board or None if it has no solution, and
+       the number of boards solved by propagation alone.'''
+    cand = boards_to_candidates(boards)
+    alive = propagate_batch(cand)
+    solved = alive & (cand.sum(axis=2) == 1).all(axis=1)
+    reduced = candidates_to_boards(cand)
+
+    solutions = []
+    for n in range(len(reduced)):
+        if not alive[n]:
+            solutions.append(None)
+        elif solved[n]:
+            solutions.append(reduced[n])
+        else:
+            #per-board search from the cells propagation solved
+            puzzle, var_array = sudoku_bitboard_model(reduced[n])
+            result = BitboardBT(puzzle).bt_search(verbose=False)
+            solutions.append(result.grid(var_array) if result.solved() else None)
+    return solutions, int(solved.sum())
@@ -1,5 +1,6 @@
 from sudoku_csp import *
 from propagator import *
+from sudoku_bitboard import *
 
 num_boards=244
 
@@ -1474,13 +1475,17 @@ if __name__ == "__main__":
     '''
     the model flag is for choosing either "binary" or "all diff" to run the 
     test cases using the "Binary" or "all different" model respectively.
+    "bitboard" uses the specialized sudoku engine of sudoku_bitboard.py,
+    which does its own propagation and ignores the propagator flag.
     '''
     model = "binary"
         
     '''
     The propagator flag is for determining which propagator to use from the 
     propagator.py file. The selections are "BT" for back tracking, "FC" for
-    forward checking, and "GAC" for the GAC propagator.
+    forward checking, "GAC" for the GAC propagator, and "ALLDIFF" for GAC
+    using the matching based all-different filtering (for the "all diff"
+    model).
     '''
     propagator = "GAC"
     
@@ -1492,10 +1497,15 @@ if __name__ == "__main__":
             csp, var_array = sudoku_csp_binary_model(b)
         elif model == "all diff":
             csp, var_array = sudoku_csp_all_diff_model(b)
+        elif model == "bitboard":
+            csp, var_array = sudoku_bitboard_model(b)
         else:
             print("***Invalid flag for model. Terminating testcase.py")
             exit(1)             
-        solver = BT(csp)
+        if model == "bitboard":
+            solver = BitboardBT(csp)
+        else:
+            solver = BT(csp)
         print("=======================================================")
         if propagator == "BT":
             print("Propagator: BT")
@@ -1506,6 +1516,9 @@ if __name__ == "__main__":
         elif propagator == "GAC":
             print("Propagator: GAC")
             solver.bt_search(prop_GAC)     
+        elif propagator == "ALLDIFF":
+            print("Propagator: ALLDIFF")
+            solver.bt_search(prop_ALLDIFF)
         else:
             print("***Invalid flag for propagator. Terminating testcase.py")
             exit(1)        